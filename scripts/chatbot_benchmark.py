@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+KernelFlow Chatbot Benchmark
+============================
+Lasttest für chatbot_server.py ohne echtes Modell.
+
+Startet einen Ollama-Stub (/api/chat, /api/tags, /api/embeddings) mit
+einstellbarer Latenz, Token-Rate und Antwortlänge, dazu den Chatbot-Server
+mit einer Kopie des data/-Verzeichnisses, und schickt dann viele parallele
+Sessions mit mehreren Gesprächsrunden an /chat.
+
+Gemessen werden Durchsatz, Latenz (p50/p95/p99), Zeit bis zum ersten Token
+(bei Streaming) und der Speicherverbrauch des Servers (RSS, nur Linux). Das
+Ergebnis wird als JSON ausgegeben, sodass zwei Läufe direkt verglichen
+werden können.
+
+Beispiele:
+  python scripts/chatbot_benchmark.py
+  python scripts/chatbot_benchmark.py --sessions 200 --turns 4 --concurrency 32 --stream
+  python scripts/chatbot_benchmark.py --output bench.json --compare baseline.json
+  python scripts/chatbot_benchmark.py --stub-only --stub-port 11435
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+DATA_DIR = PROJECT_ROOT / 'data'
+SERVER_SCRIPT = SCRIPT_DIR / 'chatbot_server.py'
+
+# Dateien, die der Chatbot-Server aus data/ liest
+DATA_FILES = ('content.json', 'chatbot-system-prompt.md', 'chatbot-system-prompt.txt', 'chatbot-wissensbasis.md')
+
+# Typische Besucherfragen; Folgefragen beziehen sich auf die vorherige Antwort
+FIRST_QUESTIONS = [
+    'Was bietet KernelFlow an?',
+    'Wie kann ich euch kontaktieren?',
+    'Was kostet eine Website?',
+    'Welche Technologien verwendet ihr?',
+    'Bietet ihr auch Hosting an?',
+    'Wie lange dauert ein Projekt?',
+]
+FOLLOW_UPS = [
+    'Kannst du das genauer erklären?',
+    'Gibt es dazu ein Beispiel?',
+    'Was wären die nächsten Schritte?',
+    'Und wie sieht es mit der Wartung aus?',
+]
+
+# Wörter, aus denen der Stub seine Antworten zusammensetzt
+STUB_WORDS = ('Gerne', 'helfe', 'ich', 'Ihnen', 'weiter', 'mit', 'unserem', 'Angebot', 'für', 'Ihr', 'Projekt')
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    """Beantwortet Ollama-API-Aufrufe mit synthetischen Antworten."""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def send_json(self, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_chunk(self, data):
+        line = (json.dumps(data) + '\n').encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+        self.wfile.flush()
+    
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self.send_json({'models': [{'name': self.server.options['model']}]})
+        else:
+            self.send_error(404)
+    
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        data = json.loads(self.rfile.read(length) or b'{}')
+        self.server.count_request()
+        
+        if self.path in ('/api/embeddings', '/api/embed'):
+            text = data.get('prompt') or data.get('input') or ''
+            self.send_json({'embedding': [float(len(text) % 7), 1.0, 0.5]})
+            return
+        if self.path != '/api/chat':
+            self.send_error(404)
+            return
+        
+        options = self.server.options
+        num_predict = data.get('options', {}).get('num_predict') or options['tokens']
+        tokens = [random.choice(STUB_WORDS) + ' ' for _ in range(min(options['tokens'], num_predict))]
+        prompt_chars = sum(len(m.get('content', '')) for m in data.get('messages', []))
+        eval_duration = len(tokens) / options['token_rate'] if options['token_rate'] > 0 else 0
+        stats = {
+            'done': True,
+            'model': data.get('model', options['model']),
+            'prompt_eval_count': prompt_chars // 4,
+            'eval_count': len(tokens),
+            'eval_duration': int(eval_duration * 1e9),
+        }
+        
+        time.sleep(options['latency'])
+        if not data.get('stream', True):
+            time.sleep(eval_duration)
+            self.send_json({'message': {'role': 'assistant', 'content': ''.join(tokens)}, **stats})
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for token in tokens:
+                if options['token_rate'] > 0:
+                    time.sleep(1 / options['token_rate'])
+                self.send_chunk({'message': {'role': 'assistant', 'content': token}, 'done': False})
+            self.send_chunk({'message': {'role': 'assistant', 'content': ''}, **stats})
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # Abgebrochene Generierung (Client hat die Verbindung geschlossen)
+            self.close_connection = True
+
+
+class StubOllamaServer(ThreadingHTTPServer):
+    """Ollama-Ersatz mit einstellbarer Latenz (vor dem ersten Token) und Token-Rate."""
+    
+    daemon_threads = True
+    
+    def __init__(self, port, latency=0.2, token_rate=50.0, tokens=40, model='llama3.2:latest'):
+        super().__init__(('127.0.0.1', port), StubOllamaHandler)
+        self.options = {'latency': latency, 'token_rate': token_rate, 'tokens': tokens, 'model': model}
+        self.requests = 0
+        self._lock = threading.Lock()
+    
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+    
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='ollama-stub', daemon=True)
+        thread.start()
+        return thread
+
+
+def prepare_data_dir(target, ollama_url):
+    """Kopiert die Prompt-Dateien und leitet ollamaUrl auf den Stub um."""
+    for name in DATA_FILES:
+        if (DATA_DIR / name).exists():
+            shutil.copy2(DATA_DIR / name, target / name)
+    
+    content_file = target / 'content.json'
+    content = json.loads(content_file.read_text(encoding='utf-8')) if content_file.exists() else {}
+    chatbot_settings = content.setdefault('settings', {}).setdefault('chatbotSettings', {})
+    chatbot_settings['ollamaUrl'] = ollama_url
+    chatbot_settings.pop('ollamaUrls', None)
+    content_file.write_text(json.dumps(content, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+def wait_for_server(host, port, timeout=30):
+    """Wartet, bis /health antwortet."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def process_rss_kb(pid):
+    """RSS eines Prozesses inkl. Kindprozessen (Prefork-Worker) in KB; None außerhalb von Linux."""
+    total = None
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status', encoding='ascii') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total = (total or 0) + int(line.split()[1])
+                        break
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children', encoding='ascii') as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+
+class MemorySampler:
+    """Misst den RSS des Servers periodisch im Hintergrund."""
+    
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def sample(self):
+        rss = process_rss_kb(self.pid)
+        if rss is not None:
+            self.samples.append(rss)
+        return rss
+    
+    def start(self):
+        def run():
+            while not self._stop.wait(self.interval):
+                self.sample()
+        
+        self._thread = threading.Thread(target=run, name='memory-sampler', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sample()
+
+
+def percentile(values, p):
+    """Perzentil per Nearest-Rank; None bei leerer Liste."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_latencies(values):
+    """Kennzahlen einer Latenzliste (Sekunden) in Millisekunden."""
+    if not values:
+        return None
+    return {
+        'p50': round(percentile(values, 50) * 1000, 2),
+        'p95': round(percentile(values, 95) * 1000, 2),
+        'p99': round(percentile(values, 99) * 1000, 2),
+        'mean': round(sum(values) / len(values) * 1000, 2),
+        'max': round(max(values) * 1000, 2),
+    }
+
+
+def chat_request(host, port, message, session_id, stream, timeout):
+    """Schickt eine Nachricht an /chat; liefert (Session-ID, Latenz, Zeit bis erstes Token)."""
+    payload = {'message': message, 'stream': stream}
+    headers = {'Content-Type': 'application/json'}
+    if session_id:
+        headers['X-Session-ID'] = session_id
+    
+    started = time.monotonic()
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request('POST', '/chat', body=json.dumps(payload).encode('utf-8'), headers=headers)
+        response = conn.getresponse()
+        if response.status != 200:
+            raise RuntimeError(f'HTTP {response.status}')
+        
+        if not stream:
+            data = json.loads(response.read().decode('utf-8'))
+            return data.get('session_id'), time.monotonic() - started, None
+        
+        first_token = None
+        event = None
+        for raw in response:
+            line = raw.decode('utf-8').rstrip('\n')
+            if line.startswith('event: '):
+                event = line[7:]
+            elif line.startswith('data: '):
+                data = json.loads(line[6:])
+                if event == 'start':
+                    session_id = data.get('session_id', session_id)
+                elif event == 'token' and first_token is None:
+                    first_token = time.monotonic() - started
+                elif event == 'error':
+                    raise RuntimeError(data.get('error', 'Stream-Fehler'))
+                elif event == 'done':
+                    break
+        return session_id, time.monotonic() - started, first_token
+    finally:
+        conn.close()
+
+
+def run_session(index, args, results):
+    """Führt ein Gespräch mit mehreren Runden."""
+    rng = random.Random(args.seed + index)
+    question = rng.choice(FIRST_QUESTIONS)
+    if not args.shared_questions:
+        # Eigene Frage pro Session, damit der Antwort-Cache nicht greift
+        question = f'{question} (Besucher {index})'
+    
+    session_id = None
+    for turn in range(args.turns):
+        message = question if turn == 0 else rng.choice(FOLLOW_UPS)
+        try:
+            session_id, latency, first_token = chat_request(
+                args.host, args.port, message, session_id, args.stream, args.timeout
+            )
+            results.record(latency, first_token)
+        except Exception as e:
+            results.record_error(e)
+            return
+
+
+class Results:
+    """Sammelt Messwerte aus allen Load-Threads."""
+    
+    def __init__(self):
+        self.latencies = []
+        self.first_tokens = []
+        self.errors = {}
+        self._lock = threading.Lock()
+    
+    def record(self, latency, first_token=None):
+        with self._lock:
+            self.latencies.append(latency)
+            if first_token is not None:
+                self.first_tokens.append(first_token)
+    
+    def record_error(self, error):
+        kind = type(error).__name__ if not isinstance(error, RuntimeError) else str(error)
+        with self._lock:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+def start_chatbot_server(args, data_dir, ollama_url):
+    """Startet chatbot_server.py als Kindprozess mit eigenem Datenverzeichnis."""
+    env = dict(os.environ)
+    env.update({
+        'CHATBOT_PORT': str(args.port),
+        'CHATBOT_DATA_DIR': str(data_dir),
+        'OLLAMA_URL': ollama_url,
+        'OLLAMA_URLS': '',
+        'OLLAMA_WARMUP': '0',
+        # Alle Lastgenerator-Sessions kommen von 127.0.0.1; das Limit pro Client
+        # würde sonst fast alle Requests mit 429 abweisen
+        'RATE_LIMIT_PER_MINUTE': '0',
+        'SESSION_DB': str(data_dir / 'chatbot-sessions.db'),
+    })
+    command = [sys.executable, str(SERVER_SCRIPT)]
+    if args.workers:
+        command += ['--workers', str(args.workers)]
+    log = open(data_dir / 'server.log', 'w', encoding='utf-8')
+    process = subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, log
+
+
+def run_benchmark(args):
+    """Führt den Lasttest aus und liefert das Ergebnis als dict."""
+    stub = StubOllamaServer(args.stub_port, args.stub_latency, args.stub_token_rate, args.stub_tokens)
+    stub.start()
+    ollama_url = f'http://127.0.0.1:{stub.server_address[1]}'
+    
+    process = log = None
+    temp_dir = None
+    try:
+        if not args.server_url:
+            temp_dir = Path(tempfile.mkdtemp(prefix='chatbot-bench-'))
+            prepare_data_dir(temp_dir, ollama_url)
+            process, log = start_chatbot_server(args, temp_dir, ollama_url)
+        if not wait_for_server(args.host, args.port):
+            raise RuntimeError(f'Chatbot-Server auf {args.host}:{args.port} antwortet nicht')
+        
+        sampler = MemorySampler(process.pid) if process is not None else None
+        memory_start = sampler.sample() if sampler else None
+        if sampler:
+            sampler.start()
+        
+        results = Results()
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for index in range(args.sessions):
+                executor.submit(run_session, index, args, results)
+        duration = time.monotonic() - started
+        
+        if sampler:
+            sampler.stop()
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+        stub.shutdown()
+        stub.server_close()
+        if temp_dir is not None and not args.keep_data:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    completed = len(results.latencies)
+    memory = None
+    if sampler and sampler.samples:
+        memory = {
+            'start_kb': memory_start,
+            'end_kb': sampler.samples[-1],
+            'peak_kb': max(sampler.samples),
+            'growth_kb': sampler.samples[-1] - (memory_start or sampler.samples[0]),
+        }
+    
+    return {
+        'config': {
+            'sessions': args.sessions,
+            'turns': args.turns,
+            'concurrency': args.concurrency,
+            'stream': args.stream,
+            'shared_questions': args.shared_questions,
+            'workers': args.workers,
+            'stub_latency': args.stub_latency,
+            'stub_token_rate': args.stub_token_rate,
+            'stub_tokens': args.stub_tokens,
+        },
+        'requests': completed,
+        'errors': dict(sorted(results.errors.items())),
+        'ollama_requests': stub.requests,
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(completed / duration, 2) if duration > 0 else None,
+        'latency_ms': summarize_latencies(results.latencies),
+        'first_token_ms': summarize_latencies(results.first_tokens),
+        'memory': memory,
+    }
+
+
+def compare(current, baseline):
+    """Gibt die relative Veränderung der wichtigsten Kennzahlen aus."""
+    rows = [('throughput_rps', current.get('throughput_rps'), baseline.get('throughput_rps'))]
+    for section in ('latency_ms', 'first_token_ms'):
+        for key in ('p50', 'p95', 'p99'):
+            rows.append((f'{section}.{key}', (current.get(section) or {}).get(key), (baseline.get(section) or {}).get(key)))
+    rows.append(('memory.growth_kb', (current.get('memory') or {}).get('growth_kb'), (baseline.get('memory') or {}).get('growth_kb')))
+    
+    print('\n📊 Vergleich mit Baseline:')
+    for name, now, before in rows:
+        if now is None or before is None:
+            continue
+        change = f'{(now - before) / before * 100:+.1f}%' if before else 'n/a'
+        print(f'   {name:<22} {before:>10} → {now:>10}  ({change})')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Lasttest für den KernelFlow Chatbot-Server mit Ollama-Stub')
+    parser.add_argument('--sessions', type=int, default=50, help='Anzahl Gespräche (Standard: 50)')
+    parser.add_argument('--turns', type=int, default=3, help='Nachrichten pro Gespräch (Standard: 3)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Gleichzeitige Gespräche (Standard: 16)')
+    parser.add_argument('--stream', action='store_true', help='Antworten per SSE streamen')
+    parser.add_argument('--shared-questions', action='store_true',
+                        help='Alle Sessions stellen dieselben Erstfragen (Antwort-Cache und Coalescing greifen)')
+    parser.add_argument('--workers', type=int, default=0, help='--workers für den Chatbot-Server (0 = dessen Standard)')
+    parser.add_argument('--port', type=int, default=18001, help='Port des Chatbot-Servers (Standard: 18001)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--server-url', action='store_true',
+                        help='Bereits laufenden Server auf --host/--port testen statt einen zu starten')
+    parser.add_argument('--timeout', type=float, default=120, help='Timeout pro Request in Sekunden')
+    parser.add_argument('--seed', type=int, default=1, help='Zufalls-Seed für die Fragenauswahl')
+    parser.add_argument('--stub-port', type=int, default=0, help='Port des Ollama-Stubs (0 = beliebig)')
+    parser.add_argument('--stub-latency', type=float, default=0.2, help='Sekunden bis zum ersten Token (Standard: 0.2)')
+    parser.add_argument('--stub-token-rate', type=float, default=50, help='Tokens pro Sekunde (Standard: 50, 0 = sofort)')
+    parser.add_argument('--stub-tokens', type=int, default=40, help='Tokens pro Antwort (Standard: 40)')
+    parser.add_argument('--stub-only', action='store_true', help='Nur den Ollama-Stub starten (bis Ctrl+C)')
+    parser.add_argument('--keep-data', action='store_true', help='Temporäres Datenverzeichnis (inkl. server.log) behalten')
+    parser.add_argument('--output', help='Ergebnis zusätzlich als JSON-Datei speichern')
+    parser.add_argument('--compare', help='Baseline-JSON eines früheren Laufs zum Vergleich')
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    
+    if args.stub_only:
+        stub = StubOllamaServer(args.stub_port or 11434, args.stub_latency, args.stub_token_rate, args.stub_tokens)
+        print(f"🧪 Ollama-Stub läuft auf http://127.0.0.1:{stub.server_address[1]} (Ctrl+C zum Beenden)")
+        try:
+            stub.serve_forever()
+        except KeyboardInterrupt:
+            stub.server_close()
+        return
+    
+    print(f"🏁 Benchmark: {args.sessions} Sessions × {args.turns} Runden, {args.concurrency} parallel"
+          f"{', Streaming' if args.stream else ''}")
+    result = run_benchmark(args)
+    output = json.dumps(result, indent=2, sort_keys=True)
+    print(output)
+    
+    if args.output:
+        Path(args.output).write_text(output + '\n', encoding='utf-8')
+        print(f"💾 Ergebnis gespeichert: {args.output}")
+    if args.compare:
+        compare(result, json.loads(Path(args.compare).read_text(encoding='utf-8')))
+    
+    if result['errors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -16,17 +16,57 @@ Starten:
 Oder mit Custom Port:
   CHATBOT_PORT=8001 python scripts/chatbot_server.py
 
-Der Server lauscht standardmäßig auf Port 8001.
+Mit mehreren Worker-Prozessen (Linux/macOS, Sessions werden per SQLite geteilt):
+  python scripts/chatbot_server.py --workers 4
+
+Häufige Fragen vorab beantworten (z.B. nachts per Cron); der Server liefert
+sie danach direkt aus dem Antwort-Speicher:
+  python scripts/chatbot_server.py --batch faq.jsonl
+
+Der Server lauscht standardmäßig auf Port 8001 und bearbeitet Requests
+parallel in einem Thread-Pool (CHATBOT_THREADS, Standard: 16). Sind alle
+Threads belegt, warten höchstens CHATBOT_BACKLOG weitere Verbindungen,
+darüber wird sofort mit 503 geantwortet; /health und /metrics werden dann
+an den wartenden Requests vorbei beantwortet.
+
+POST /chat mit {"stream": true} oder `Accept: text/event-stream` liefert
+die Antwort als Server-Sent Events (start, token, done/error).
+
+Generierungen laufen über einen Scheduler: höchstens GENERATION_CONCURRENCY
+gleichzeitig, Wartende werden reihum nach Client und Session bedient. Ist
+die erwartete Wartezeit zu lang, antwortet /chat sofort mit 503, bei zu
+vielen Anfragen eines Clients mit 429 (jeweils mit Retry-After).
+
+GET /metrics liefert Latenzen je Request-Phase, Tokens/s und Fehlerzähler
+im Prometheus-Textformat.
 """
 
 import os
+import sys
 import json
+import signal
+import argparse
 import re
+import sqlite3
+import unicodedata
 import uuid
+import math
+import bisect
+import time
+import hashlib
+import threading
+import queue
+import random
+import gzip
+import ipaddress
+import select
+import socket
+import http.client
+from collections import Counter, OrderedDict, namedtuple
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
-import urllib.request
-import urllib.error
 from datetime import datetime
 from pathlib import Path
 
@@ -36,19 +76,99 @@ OLLAMA_URL = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
 OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL', 'llama3.2:latest')
 MAX_TOKENS = int(os.environ.get('MAX_TOKENS', 1024))
 TEMPERATURE = float(os.environ.get('TEMPERATURE', 0.7))
+# Anzahl Worker-Threads für parallele Requests
+CHATBOT_THREADS = int(os.environ.get('CHATBOT_THREADS', 16))
+# Verbindungen, die auf einen freien Worker-Thread warten dürfen; weitere werden mit 503 abgelehnt
+CHATBOT_BACKLOG = int(os.environ.get('CHATBOT_BACKLOG', 16))
+# Anzahl Worker-Prozesse (Prefork, nur Linux/macOS); >1 erzwingt das SQLite-Session-Backend
+CHATBOT_WORKERS = int(os.environ.get('CHATBOT_WORKERS', 1))
+# Maximale Dauer (Sekunden) einer Generierung pro /chat-Request, 0 = unbegrenzt
+CHATBOT_REQUEST_DEADLINE = float(os.environ.get('CHATBOT_REQUEST_DEADLINE', 180))
+# Sekunden, die eine Keep-Alive-Verbindung ohne neuen Request einen Worker-Thread belegen darf
+CHATBOT_KEEPALIVE_TIMEOUT = float(os.environ.get('CHATBOT_KEEPALIVE_TIMEOUT', 5))
+# Gleichzeitige Ollama-Generierungen pro Worker-Prozess, 0 = unbegrenzt; weitere Requests warten fair verteilt
+GENERATION_CONCURRENCY = int(os.environ.get('GENERATION_CONCURRENCY', 4))
+# Maximal wartende Requests und maximale erwartete Wartezeit (Sekunden), darüber wird mit 503 abgelehnt
+GENERATION_QUEUE_SIZE = int(os.environ.get('GENERATION_QUEUE_SIZE', 12))
+GENERATION_MAX_WAIT = float(os.environ.get('GENERATION_MAX_WAIT', 30))
+# /chat-Requests pro Client und Minute (Token-Bucket) und erlaubter Burst, 0 = kein Limit
+RATE_LIMIT_PER_MINUTE = float(os.environ.get('RATE_LIMIT_PER_MINUTE', 20))
+RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST', 10))
+# Wie lange Browser ein CORS-Preflight cachen dürfen (Chrome begrenzt auf 2 Stunden)
+CORS_MAX_AGE = 7200
+# JSON-Antworten ab dieser Größe (Bytes) werden gzip-komprimiert, falls der Client es erlaubt
+GZIP_MIN_SIZE = 1024
+# Maximale Größe eines Request-Bodys
+MAX_BODY_SIZE = 1024 * 1024
+# Keep-Alive-Verbindungen zu Ollama: max. gleichzeitige Verbindungen, Timeouts, Retries
+OLLAMA_POOL_SIZE = int(os.environ.get('OLLAMA_POOL_SIZE', 8))
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', 5))
+OLLAMA_READ_TIMEOUT = float(os.environ.get('OLLAMA_READ_TIMEOUT', 120))
+OLLAMA_RETRIES = int(os.environ.get('OLLAMA_RETRIES', 1))
+# Wissensbasis: 'retrieval' hängt nur die relevantesten Abschnitte an, 'full' die ganze Datei
+KNOWLEDGE_MODE = os.environ.get('KNOWLEDGE_MODE', 'retrieval')
+KNOWLEDGE_TOP_K = int(os.environ.get('KNOWLEDGE_TOP_K', 4))
+# Abschnitte (Teilstring der Überschrift), die immer mitgeschickt werden
+KNOWLEDGE_PINNED = os.environ.get('KNOWLEDGE_PINNED', 'Unternehmensübersicht,Wichtige Hinweise')
+# Abschnitte, die mitgeschickt werden, wenn die Suche nichts findet
+KNOWLEDGE_FALLBACK = os.environ.get('KNOWLEDGE_FALLBACK', 'Häufige Fragen,Kontaktinformationen')
+# Optionales Ollama-Embedding-Modell (z.B. nomic-embed-text) zusätzlich zu BM25
+EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', '')
+# Token-Budget für die wörtlich mitgeschickte Gesprächshistorie; Älteres wird zusammengefasst
+HISTORY_TOKEN_BUDGET = int(os.environ.get('HISTORY_TOKEN_BUDGET', 2000))
+SUMMARY_MAX_TOKENS = int(os.environ.get('SUMMARY_MAX_TOKENS', 256))
+# Antwort-Cache für Erstfragen: max. Einträge (0 = aus) und Gültigkeit in Sekunden
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 512))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 3600))
+# Prompt-Aufbau: 'stable' hält den statischen Anfang byte-gleich (KV-Cache von Ollama), 'legacy' wie früher
+PROMPT_LAYOUT = os.environ.get('PROMPT_LAYOUT', 'stable')
+# Wie lange Ollama das Modell nach einem Request geladen hält (z.B. '30m', '-1' = immer)
+OLLAMA_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE', '30m')
+# Grenzen für num_ctx (Kontextfenster pro Request); NUM_CTX_MAX=0 überlässt es Ollama
+NUM_CTX_MIN = int(os.environ.get('NUM_CTX_MIN', 2048))
+NUM_CTX_MAX = int(os.environ.get('NUM_CTX_MAX', 8192))
+# Modell beim Start und nach Modell-/Prompt-Wechsel vorladen (1/0)
+OLLAMA_WARMUP = os.environ.get('OLLAMA_WARMUP', '1') == '1'
+# Mehrere Ollama-Instanzen (kommagetrennt); leer = nur ollamaUrl aus den Einstellungen
+OLLAMA_URLS = os.environ.get('OLLAMA_URLS', '')
+# Health-Check-Intervall (Sekunden) und Fehler in Folge, nach denen ein Backend ausgeklinkt wird
+OLLAMA_HEALTH_INTERVAL = float(os.environ.get('OLLAMA_HEALTH_INTERVAL', 10))
+OLLAMA_MAX_FAILURES = int(os.environ.get('OLLAMA_MAX_FAILURES', 2))
+# Prüfintervall (Sekunden) für Änderungen an Prompt- und Content-Dateien, 0 = bei jedem Request
+PROMPT_WATCH_INTERVAL = float(os.environ.get('PROMPT_WATCH_INTERVAL', 2))
+
+# Logging: Format 'json' (eine Zeile pro Eintrag) oder 'text', Mindest-Level, Datei statt stdout
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'info')
+LOG_FILE = os.environ.get('LOG_FILE', '')
+# Anteil der Requests, deren Info-Einträge geschrieben werden (Warnungen und Fehler immer)
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+# Gepufferte Einträge; ist der Puffer voll, wird verworfen statt zu blockieren
+LOG_BUFFER = int(os.environ.get('LOG_BUFFER', 10000))
 
 # Pfade
 SCRIPT_DIR = Path(__file__).parent
 PROJECT_ROOT = SCRIPT_DIR.parent
-DATA_DIR = PROJECT_ROOT / 'data'
+# Datenverzeichnis (content.json, Prompt-Dateien); per CHATBOT_DATA_DIR umstellbar, z.B. für Benchmarks
+DATA_DIR = Path(os.environ.get('CHATBOT_DATA_DIR', PROJECT_ROOT / 'data'))
 CONFIG_FILE = SCRIPT_DIR / 'config.json'
-
-# In-Memory Session Storage (wird bei Server-Neustart gelöscht)
-# Key: session_id, Value: {"messages": [...], "created_at": datetime, "last_activity": datetime}
-sessions = {}
+CACHE_DIR = DATA_DIR / '.chatbot-cache'
+SESSION_DB = Path(os.environ.get('SESSION_DB', DATA_DIR / 'chatbot-sessions.db'))
+# Vorberechnete Antworten aus dem Batch-Modus (--batch)
+ANSWER_STORE = Path(os.environ.get('ANSWER_STORE', CACHE_DIR / 'answers.json'))
 
 # Session-Timeout in Sekunden (30 Minuten)
 SESSION_TIMEOUT = 1800
+# Obergrenzen des Session-Speichers; darüber werden die am längsten inaktiven Sessions verdrängt
+MAX_SESSIONS = int(os.environ.get('MAX_SESSIONS', 10000))
+MAX_SESSION_MESSAGES = int(os.environ.get('MAX_SESSION_MESSAGES', 200))
+SESSION_MEMORY_MB = float(os.environ.get('SESSION_MEMORY_MB', 64))
+# Intervall (Sekunden), in dem abgelaufene Sessions im Hintergrund entfernt werden
+SESSION_SWEEP_INTERVAL = float(os.environ.get('SESSION_SWEEP_INTERVAL', 60))
+# Session-Backend: 'memory' (Standard) oder 'sqlite' (überlebt Neustarts)
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'memory')
+# Intervall (Sekunden), in dem gesammelte Änderungen in die SQLite-Datenbank geschrieben werden
+SESSION_FLUSH_INTERVAL = float(os.environ.get('SESSION_FLUSH_INTERVAL', 0.5))
 
 
 def load_config():
@@ -58,6 +178,51 @@ def load_config():
         'ollama_model': OLLAMA_MODEL,
         'max_tokens': MAX_TOKENS,
         'temperature': TEMPERATURE,
+        'threads': CHATBOT_THREADS,
+        'backlog': CHATBOT_BACKLOG,
+        'workers': CHATBOT_WORKERS,
+        'keepalive_timeout': CHATBOT_KEEPALIVE_TIMEOUT,
+        'request_deadline': CHATBOT_REQUEST_DEADLINE,
+        'generation_concurrency': GENERATION_CONCURRENCY,
+        'generation_queue_size': GENERATION_QUEUE_SIZE,
+        'generation_max_wait': GENERATION_MAX_WAIT,
+        'rate_limit_per_minute': RATE_LIMIT_PER_MINUTE,
+        'rate_limit_burst': RATE_LIMIT_BURST,
+        'prompt_watch_interval': PROMPT_WATCH_INTERVAL,
+        'ollama_pool_size': OLLAMA_POOL_SIZE,
+        'ollama_connect_timeout': OLLAMA_CONNECT_TIMEOUT,
+        'ollama_read_timeout': OLLAMA_READ_TIMEOUT,
+        'ollama_retries': OLLAMA_RETRIES,
+        'knowledge_mode': KNOWLEDGE_MODE,
+        'knowledge_top_k': KNOWLEDGE_TOP_K,
+        'knowledge_pinned': [h.strip() for h in KNOWLEDGE_PINNED.split(',') if h.strip()],
+        'knowledge_fallback': [h.strip() for h in KNOWLEDGE_FALLBACK.split(',') if h.strip()],
+        'embedding_model': EMBEDDING_MODEL,
+        'history_token_budget': HISTORY_TOKEN_BUDGET,
+        'summary_max_tokens': SUMMARY_MAX_TOKENS,
+        'max_sessions': MAX_SESSIONS,
+        'max_session_messages': MAX_SESSION_MESSAGES,
+        'session_memory_mb': SESSION_MEMORY_MB,
+        'session_sweep_interval': SESSION_SWEEP_INTERVAL,
+        'session_backend': SESSION_BACKEND,
+        'session_db': str(SESSION_DB),
+        'session_flush_interval': SESSION_FLUSH_INTERVAL,
+        'response_cache_size': RESPONSE_CACHE_SIZE,
+        'response_cache_ttl': RESPONSE_CACHE_TTL,
+        'prompt_layout': PROMPT_LAYOUT,
+        'num_ctx_min': NUM_CTX_MIN,
+        'num_ctx_max': NUM_CTX_MAX,
+        'keep_alive': OLLAMA_KEEP_ALIVE,
+        'warmup': OLLAMA_WARMUP,
+        'ollama_urls': [u.strip() for u in OLLAMA_URLS.split(',') if u.strip()],
+        'ollama_health_interval': OLLAMA_HEALTH_INTERVAL,
+        'ollama_max_failures': OLLAMA_MAX_FAILURES,
+        'answer_store': str(ANSWER_STORE),
+        'log_format': LOG_FORMAT,
+        'log_level': LOG_LEVEL,
+        'log_file': LOG_FILE,
+        'log_sample_rate': LOG_SAMPLE_RATE,
+        'log_buffer': LOG_BUFFER,
     }
     
     if CONFIG_FILE.exists():
@@ -71,6 +236,51 @@ def load_config():
                     'ollama_model': chatbot_config.get('ollama_model', config['ollama_model']),
                     'max_tokens': chatbot_config.get('max_tokens', config['max_tokens']),
                     'temperature': chatbot_config.get('temperature', config['temperature']),
+                    'threads': int(chatbot_config.get('threads', config['threads'])),
+                    'backlog': int(chatbot_config.get('backlog', config['backlog'])),
+                    'keepalive_timeout': float(chatbot_config.get('keepalive_timeout', config['keepalive_timeout'])),
+                    'request_deadline': float(chatbot_config.get('request_deadline', config['request_deadline'])),
+                    'generation_concurrency': int(chatbot_config.get('generation_concurrency', config['generation_concurrency'])),
+                    'generation_queue_size': int(chatbot_config.get('generation_queue_size', config['generation_queue_size'])),
+                    'generation_max_wait': float(chatbot_config.get('generation_max_wait', config['generation_max_wait'])),
+                    'rate_limit_per_minute': float(chatbot_config.get('rate_limit_per_minute', config['rate_limit_per_minute'])),
+                    'rate_limit_burst': int(chatbot_config.get('rate_limit_burst', config['rate_limit_burst'])),
+                    'workers': int(chatbot_config.get('workers', config['workers'])),
+                    'prompt_watch_interval': float(chatbot_config.get('prompt_watch_interval', config['prompt_watch_interval'])),
+                    'ollama_pool_size': int(chatbot_config.get('ollama_pool_size', config['ollama_pool_size'])),
+                    'ollama_connect_timeout': float(chatbot_config.get('ollama_connect_timeout', config['ollama_connect_timeout'])),
+                    'ollama_read_timeout': float(chatbot_config.get('ollama_read_timeout', config['ollama_read_timeout'])),
+                    'ollama_retries': int(chatbot_config.get('ollama_retries', config['ollama_retries'])),
+                    'knowledge_mode': chatbot_config.get('knowledge_mode', config['knowledge_mode']),
+                    'knowledge_top_k': int(chatbot_config.get('knowledge_top_k', config['knowledge_top_k'])),
+                    'knowledge_pinned': chatbot_config.get('knowledge_pinned', config['knowledge_pinned']),
+                    'knowledge_fallback': chatbot_config.get('knowledge_fallback', config['knowledge_fallback']),
+                    'embedding_model': chatbot_config.get('embedding_model', config['embedding_model']),
+                    'history_token_budget': int(chatbot_config.get('history_token_budget', config['history_token_budget'])),
+                    'summary_max_tokens': int(chatbot_config.get('summary_max_tokens', config['summary_max_tokens'])),
+                    'max_sessions': int(chatbot_config.get('max_sessions', config['max_sessions'])),
+                    'max_session_messages': int(chatbot_config.get('max_session_messages', config['max_session_messages'])),
+                    'session_memory_mb': float(chatbot_config.get('session_memory_mb', config['session_memory_mb'])),
+                    'session_sweep_interval': float(chatbot_config.get('session_sweep_interval', config['session_sweep_interval'])),
+                    'session_backend': chatbot_config.get('session_backend', config['session_backend']),
+                    'session_db': chatbot_config.get('session_db', config['session_db']),
+                    'session_flush_interval': float(chatbot_config.get('session_flush_interval', config['session_flush_interval'])),
+                    'response_cache_size': int(chatbot_config.get('response_cache_size', config['response_cache_size'])),
+                    'response_cache_ttl': float(chatbot_config.get('response_cache_ttl', config['response_cache_ttl'])),
+                    'prompt_layout': chatbot_config.get('prompt_layout', config['prompt_layout']),
+                    'num_ctx_min': int(chatbot_config.get('num_ctx_min', config['num_ctx_min'])),
+                    'num_ctx_max': int(chatbot_config.get('num_ctx_max', config['num_ctx_max'])),
+                    'keep_alive': chatbot_config.get('keep_alive', config['keep_alive']),
+                    'warmup': bool(chatbot_config.get('warmup', config['warmup'])),
+                    'ollama_urls': chatbot_config.get('ollama_urls', config['ollama_urls']),
+                    'ollama_health_interval': float(chatbot_config.get('ollama_health_interval', config['ollama_health_interval'])),
+                    'ollama_max_failures': int(chatbot_config.get('ollama_max_failures', config['ollama_max_failures'])),
+                    'answer_store': chatbot_config.get('answer_store', config['answer_store']),
+                    'log_format': chatbot_config.get('log_format', config['log_format']),
+                    'log_level': chatbot_config.get('log_level', config['log_level']),
+                    'log_file': chatbot_config.get('log_file', config['log_file']),
+                    'log_sample_rate': float(chatbot_config.get('log_sample_rate', config['log_sample_rate'])),
+                    'log_buffer': int(chatbot_config.get('log_buffer', config['log_buffer'])),
                 })
         except Exception as e:
             print(f"⚠️  Config-Datei konnte nicht geladen werden: {e}")
@@ -78,8 +288,159 @@ def load_config():
     return config
 
 
-def load_chatbot_settings():
-    """Lädt Chatbot-Einstellungen aus content.json."""
+# Log-Level in aufsteigender Wichtigkeit
+LOG_LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+
+# Kontext des Requests, den der aktuelle Thread bearbeitet (Request-ID, Session, Sampling)
+log_context = threading.local()
+
+
+class AsyncLogger:
+    """Strukturiertes Logging, das den Request-Thread nicht blockiert.
+    
+    Einträge landen in einer begrenzten Queue, ein Hintergrund-Thread
+    formatiert sie (JSON-Zeilen oder Text) und schreibt sie gesammelt nach
+    stdout bzw. in `path`. Ist die Queue voll, weil die Ausgabe nicht
+    hinterherkommt, wird der Eintrag verworfen und nur gezählt. Request-ID
+    und Session aus log_context werden automatisch angehängt; bei nicht
+    gesampelten Requests werden nur Warnungen und Fehler geschrieben.
+    """
+    
+    def __init__(self, level=LOG_LEVEL, fmt=LOG_FORMAT, path=LOG_FILE, sample_rate=LOG_SAMPLE_RATE, buffer_size=LOG_BUFFER):
+        self.configure(level, fmt, path, sample_rate, buffer_size)
+        self.dropped = 0
+        self.written = 0
+        self._queue = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+    
+    def configure(self, level, fmt, path, sample_rate, buffer_size):
+        """Übernimmt die Einstellungen (ein laufender Writer behält seine Ausgabe)."""
+        self.level = LOG_LEVELS.get(str(level).lower(), LOG_LEVELS['info'])
+        self.format = fmt
+        self.path = path
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+    
+    def _after_fork(self):
+        # Den Writer-Thread gibt es im Kindprozess nicht; noch gepufferte
+        # Einträge schreibt der Elternprozess
+        self._queue = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+    
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._queue = queue.Queue(maxsize=self.buffer_size)
+                self._thread = threading.Thread(target=self._run, args=(self._queue,), name='log-writer', daemon=True)
+                self._thread.start()
+            return self._queue
+    
+    def sampled(self):
+        """Entscheidet einmal pro Request, ob dessen Info-Einträge geschrieben werden."""
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+    
+    def log(self, level, message, **fields):
+        severity = LOG_LEVELS[level]
+        if severity < self.level:
+            return
+        if severity < LOG_LEVELS['warning'] and not getattr(log_context, 'sampled', True):
+            return
+        
+        record = {'ts': time.time(), 'level': level, 'msg': message}
+        request_id = getattr(log_context, 'request_id', None)
+        if request_id:
+            record['request_id'] = request_id
+        session = getattr(log_context, 'session', None)
+        if session:
+            record['session'] = session
+        record.update(fields)
+        
+        entries = self._queue or self._start()
+        try:
+            entries.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+    
+    def debug(self, message, **fields):
+        self.log('debug', message, **fields)
+    
+    def info(self, message, **fields):
+        self.log('info', message, **fields)
+    
+    def warning(self, message, **fields):
+        self.log('warning', message, **fields)
+    
+    def error(self, message, **fields):
+        self.log('error', message, **fields)
+    
+    def _format(self, record):
+        timestamp = datetime.fromtimestamp(record['ts'])
+        if self.format == 'text':
+            extra = ' '.join(f'{k}={v}' for k, v in record.items() if k not in ('ts', 'level', 'msg'))
+            return f"[{timestamp.strftime('%Y-%m-%d %H:%M:%S')}] {record['level'].upper()} {record['msg']}{' ' + extra if extra else ''}\n"
+        record = dict(record, ts=timestamp.isoformat(timespec='milliseconds'))
+        return json.dumps(record, ensure_ascii=False, default=str) + '\n'
+    
+    def _run(self, entries):
+        """Writer-Thread: schreibt Einträge gesammelt, bis None kommt."""
+        sink = open(self.path, 'a', encoding='utf-8') if self.path else sys.stdout
+        reported = 0
+        while True:
+            batch = [entries.get()]
+            while len(batch) < 512:
+                try:
+                    batch.append(entries.get_nowait())
+                except queue.Empty:
+                    break
+            records = [record for record in batch if record is not None]
+            stop = len(records) < len(batch)
+            if self.dropped > reported:
+                records.append({'ts': time.time(), 'level': 'warning', 'msg': 'Log-Einträge verworfen',
+                                'count': self.dropped - reported})
+                reported = self.dropped
+            try:
+                sink.write(''.join(self._format(record) for record in records))
+                sink.flush()
+                self.written += len(records)
+            except (OSError, ValueError):
+                pass
+            if stop:
+                break
+        if sink is not sys.stdout:
+            sink.close()
+    
+    def close(self, timeout=2):
+        """Schreibt alle gepufferten Einträge und beendet den Writer-Thread."""
+        with self._start_lock:
+            thread, entries = self._thread, self._queue
+            self._thread, self._queue = None, None
+        if thread is None:
+            return
+        try:
+            entries.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+    
+    def stats(self):
+        entries = self._queue
+        return {
+            'written': self.written,
+            'dropped': self.dropped,
+            'queued': entries.qsize() if entries is not None else 0,
+            'sample_rate': self.sample_rate,
+        }
+
+
+log = AsyncLogger()
+
+
+def load_chatbot_settings(content=None):
+    """Lädt Chatbot-Einstellungen aus content.json (oder bereits geparstem Inhalt)."""
     content_file = DATA_DIR / 'content.json'
     defaults = {
         'enabled': True,
@@ -93,34 +454,56 @@ def load_chatbot_settings():
     }
     
     try:
-        if content_file.exists():
+        if content is None and content_file.exists():
             with open(content_file, 'r', encoding='utf-8') as f:
                 content = json.load(f)
-                chatbot_settings = content.get('settings', {}).get('chatbotSettings', {})
-                return {**defaults, **chatbot_settings}
+        if content is not None:
+            chatbot_settings = content.get('settings', {}).get('chatbotSettings', {})
+            return {**defaults, **chatbot_settings}
     except Exception as e:
-        print(f"⚠️  content.json konnte nicht geladen werden: {e}")
+        log.warning('content.json konnte nicht geladen werden', error=str(e))
     
     return defaults
 
 
-def load_knowledge_base():
-    """Lädt die Wissensbasis für den Chatbot."""
-    knowledge_file = DATA_DIR / 'chatbot-wissensbasis.md'
+def read_data_file(name, sources=None):
+    """Liest eine Datei aus DATA_DIR als Text, None wenn sie fehlt.
     
+    Mit sources (Dateiname -> Bytes, siehe PromptCache._read_sources) wird
+    der bereits gelesene Inhalt verwendet statt erneut von der Platte.
+    """
+    if sources is not None:
+        raw = sources.get(name)
+        if raw is None:
+            return None
+        # Wie beim Lesen im Textmodus: Zeilenenden vereinheitlichen
+        return raw.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    path = DATA_DIR / name
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def load_knowledge_base(sources=None):
+    """Lädt die Wissensbasis für den Chatbot."""
     try:
-        if knowledge_file.exists():
-            with open(knowledge_file, 'r', encoding='utf-8') as f:
-                return f.read()
+        return read_data_file('chatbot-wissensbasis.md', sources) or ''
     except Exception as e:
-        print(f"⚠️  Wissensbasis konnte nicht geladen werden: {e}")
+        log.warning('Wissensbasis konnte nicht geladen werden', error=str(e))
     
     return ''
 
 
-def load_system_prompt():
-    """Lädt den System-Prompt für den Chatbot."""
-    settings = load_chatbot_settings()
+def load_system_prompt(settings=None, include_knowledge=True, sources=None):
+    """Lädt den System-Prompt für den Chatbot.
+    
+    Mit include_knowledge=False wird die Wissensbasis nicht angehängt
+    (sie kommt dann abschnittsweise über den KnowledgeIndex dazu).
+    sources: bereits gelesene Quelldateien (siehe read_data_file).
+    """
+    if settings is None:
+        settings = load_chatbot_settings()
     
     # Standard-Prompt
     base_prompt = "Du bist ein hilfreicher Assistent für die KernelFlow-Webseite. Antworte höflich und informativ auf Deutsch."
@@ -129,27 +512,22 @@ def load_system_prompt():
     if settings.get('systemPromptMarkdown', '').strip():
         base_prompt = settings['systemPromptMarkdown']
     else:
-        # Versuche neue Markdown-Datei zu laden (bevorzugt)
-        prompt_file_md = DATA_DIR / 'chatbot-system-prompt.md'
-        prompt_file_txt = DATA_DIR / 'chatbot-system-prompt.txt'
-        
+        # Versuche neue Markdown-Datei zu laden (bevorzugt), sonst .txt
         try:
-            if prompt_file_md.exists():
-                with open(prompt_file_md, 'r', encoding='utf-8') as f:
-                    base_prompt = f.read()
-                print("✅ System-Prompt aus chatbot-system-prompt.md geladen")
-            elif prompt_file_txt.exists():
-                with open(prompt_file_txt, 'r', encoding='utf-8') as f:
-                    base_prompt = f.read()
-                print("✅ System-Prompt aus chatbot-system-prompt.txt geladen")
+            for name in ('chatbot-system-prompt.md', 'chatbot-system-prompt.txt'):
+                text = read_data_file(name, sources)
+                if text is not None:
+                    base_prompt = text
+                    log.info('System-Prompt geladen', file=name)
+                    break
         except Exception as e:
-            print(f"⚠️  System-Prompt Datei konnte nicht geladen werden: {e}")
+            log.warning('System-Prompt-Datei konnte nicht geladen werden', error=str(e))
     
     # Wissensbasis hinzufügen
-    knowledge_base = load_knowledge_base()
+    knowledge_base = load_knowledge_base(sources) if include_knowledge else ''
     if knowledge_base:
         base_prompt += '\n\n---\n\n# WISSENSBASIS\n\n' + knowledge_base
-        print("✅ Wissensbasis geladen und angehängt")
+        log.info('Wissensbasis geladen und angehängt')
     
     # Füge zusätzliche Anweisungen aus Admin-Settings hinzu
     if settings.get('systemPromptAddition', '').strip():
@@ -158,16 +536,17 @@ def load_system_prompt():
     return base_prompt
 
 
-def get_live_data_context():
+def get_live_data_context(content=None):
     """Lädt Live-Daten für den Chatbot-Kontext."""
     content_file = DATA_DIR / 'content.json'
     
     try:
-        if not content_file.exists():
-            return ''
-        
-        with open(content_file, 'r', encoding='utf-8') as f:
-            content = json.load(f)
+        if content is None:
+            if not content_file.exists():
+                return ''
+            
+            with open(content_file, 'r', encoding='utf-8') as f:
+                content = json.load(f)
         
         live_data = []
         
@@ -209,332 +588,3545 @@ def get_live_data_context():
             return '\n\nLIVE_DATEN:\n' + '\n\n'.join(live_data)
         
     except Exception as e:
-        print(f"⚠️  Live-Daten konnten nicht geladen werden: {e}")
+        log.warning('Live-Daten konnten nicht geladen werden', error=str(e))
     
     return ''
 
 
-def sanitize_text(text):
-    """Bereinigt Benutzereingaben."""
-    if not text:
-        return ''
-    # Entferne potenziell gefährliche Zeichen
-    text = re.sub(r'[<>]', '', text)
-    text = re.sub(r'javascript:', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'on\w+=', '', text, flags=re.IGNORECASE)
-    return text.strip()
+# Häufige deutsche Füllwörter, die für die Suche keine Bedeutung haben
+STOPWORDS = frozenset("""
+aber alle als also am an auch auf aus bei bin bis bist bitte da damit dann das dass dein deine dem
+den denn der des dich die dies diese diesem diesen dieser dir doch du durch ein eine einem einen
+einer eines er es etwas euch euer eure eurem euren eurer für gern gerne gibt gut hallo hat hätte habe
+haben hier ich ihnen ihr ihre ihrem ihren ihrer im in ist ja jetzt kann kannst kein keine können könnt
+könnte könnten mal man mehr mein meine mich mir mit möchte möchten nach nicht noch nur ob oder ohne
+schon sehr sein seine sich sie sind so soll sollte über um und uns unser unsere viel vom von vor
+wann war warum was welche welchem welchen welcher welches wenn wer werden wie wieso wir wird wo
+würde würden zu zum zur
+""".split())
+
+# Deutsche Endungen, längste zuerst; abgeschnitten wird nur, wenn mindestens 4 Zeichen bleiben
+GERMAN_SUFFIXES = tuple(sorted((
+    'ierungen', 'ierung', 'ieren', 'iert', 'ierst', 'ungen', 'ung', 'heiten', 'heit', 'keiten', 'keit',
+    'lichen', 'liche', 'lich', 'ischen', 'ische', 'isch', 'innen', 'ern', 'est', 'ten', 'te', 'et',
+    'st', 'en', 'er', 'es', 'em', 'e', 'n', 's', 't',
+), key=len, reverse=True))
+
+# Umlaute und ß für die Suche vereinheitlichen (Gespräch/Gespräche, Preis/Preise)
+UMLAUT_TABLE = str.maketrans({'ä': 'a', 'ö': 'o', 'ü': 'u', 'ß': 'ss'})
+
+# Gleichbedeutende Suchbegriffe (gestemmt), die in der Wissensbasis anders heißen
+SEARCH_SYNONYMS = {
+    'kost': ('preis',),
+    'teuer': ('preis',),
+    'gunstig': ('preis',),
+    'preis': ('kost',),
+    'websi': ('webseit',),
+    'webseit': ('websi',),
+    'homepag': ('webseit', 'websi'),
+    'ki': ('ai',),
+}
+
+# Abschnitt der Wissensbasis (Überschriften-Pfad und Text inkl. Überschrift)
+KnowledgeChunk = namedtuple('KnowledgeChunk', ['heading', 'text'])
+
+
+def stem(word):
+    """Leichter deutscher Stemmer: Umlaute falten, eine Endung abschneiden."""
+    word = word.translate(UMLAUT_TABLE)
+    for suffix in GERMAN_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    """Zerlegt Text in normalisierte Suchbegriffe (klein, ohne Füllwörter, gestemmt)."""
+    tokens = []
+    for word in re.findall(r'\w+', text.lower()):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        tokens.append(stem(word))
+    return tokens
 
 
-def cleanup_old_sessions():
-    """Entfernt abgelaufene Sessions."""
-    now = datetime.now()
-    expired = []
-    for session_id, session in sessions.items():
-        last_activity = session.get('last_activity', session.get('created_at'))
-        if (now - last_activity).total_seconds() > SESSION_TIMEOUT:
-            expired.append(session_id)
+def split_knowledge_base(markdown):
+    """Teilt die Wissensbasis an Markdown-Überschriften (#, ##, ###) in Abschnitte."""
+    sections = [('', [])]
+    path = []
+    for line in markdown.splitlines():
+        match = re.match(r'^(#{1,3})\s+(.*)', line)
+        if match:
+            level = len(match.group(1))
+            path = path[:level - 1] + [match.group(2).strip()]
+            sections.append((' > '.join(path), [line]))
+        else:
+            sections[-1][1].append(line)
     
-    for session_id in expired:
-        del sessions[session_id]
-        print(f"🗑️  Session {session_id[:8]}... abgelaufen und entfernt")
+    chunks = []
+    for heading, lines in sections:
+        # Trennlinien entfernen und reine Überschriften ohne Inhalt überspringen
+        body = '\n'.join(lines[1:] if heading else lines).strip().strip('-').strip()
+        if body:
+            text = '\n'.join(lines).strip().strip('-').strip()
+            chunks.append(KnowledgeChunk(heading, text))
+    return chunks
 
 
-def call_ollama(messages, session_id=None):
-    """Ruft Ollama API auf und gibt die Antwort zurück."""
-    settings = load_chatbot_settings()
-    system_prompt = load_system_prompt()
-    live_context = get_live_data_context()
+def cosine_similarity(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def fetch_embedding(settings, model, text):
+    """Holt ein Embedding von Ollama (/api/embeddings)."""
+    data = ollama_request(settings, 'POST', '/api/embeddings', {'model': model, 'prompt': text})
+    return data.get('embedding') or []
+
+
+def load_chunk_embeddings(chunks, settings, model):
+    """Liefert Embeddings aller Abschnitte; bereits berechnete kommen aus dem Disk-Cache."""
+    cache_file = CACHE_DIR / 'embeddings.json'
+    cache = {}
+    try:
+        if cache_file.exists():
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+    except Exception as e:
+        log.warning('Embedding-Cache konnte nicht geladen werden', error=str(e))
     
-    # Vollständiger System-Prompt mit Live-Daten
-    full_system_prompt = system_prompt + live_context
+    embeddings = []
+    changed = False
+    for chunk in chunks:
+        key = hashlib.sha256(f"{model}\0{chunk.text}".encode('utf-8')).hexdigest()
+        if key not in cache:
+            cache[key] = fetch_embedding(settings, model, chunk.text)
+            changed = True
+        embeddings.append(cache[key])
     
-    # Nachrichten für Ollama vorbereiten
-    ollama_messages = [
-        {'role': 'system', 'content': full_system_prompt}
-    ]
+    if changed:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix('.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, cache_file)
+    return embeddings
+
+
+class KnowledgeIndex:
+    """BM25-Index über die Abschnitte der Wissensbasis.
     
-    # Konversationshistorie hinzufügen
-    for msg in messages:
-        ollama_messages.append({
-            'role': msg['role'],
-            'content': sanitize_text(msg['content'])
-        })
+    Optional werden zusätzlich Ollama-Embeddings verwendet; der Score ist dann
+    der Mittelwert aus normiertem BM25-Score und Kosinus-Ähnlichkeit.
     
-    # Ollama URL und Modell aus Einstellungen
-    ollama_url = settings.get('ollamaUrl', OLLAMA_URL)
-    ollama_model = settings.get('ollamaModel', OLLAMA_MODEL)
-    max_tokens = settings.get('maxTokens', MAX_TOKENS)
-    temperature = settings.get('temperature', TEMPERATURE)
+    Ein Suchbegriff trifft auch Komposita, die mit ihm beginnen oder enden,
+    und umgekehrt ("kontakt" ~ "kontaktinformation", "preis" ~
+    "paketpreis"), mit geringerem Gewicht; dazu kommen SEARCH_SYNONYMS.
+    Findet die Suche nichts, werden die `fallback`-Abschnitte verwendet.
+    """
     
-    try:
-        request_data = json.dumps({
-            'model': ollama_model,
-            'messages': ollama_messages,
-            'stream': False,
-            'options': {
-                'temperature': temperature,
-                'top_p': 0.9,
-                'num_predict': max_tokens,
-            }
-        }).encode('utf-8')
-        
-        req = urllib.request.Request(
-            f"{ollama_url}/api/chat",
-            data=request_data,
-            headers={'Content-Type': 'application/json'},
-            method='POST'
+    # Fließt in prompt_version ein; erhöhen, wenn sich die Auswahl der Abschnitte ändert
+    VERSION = 2
+    # Mindestlänge für Wortanfangs-Treffer und ihr Gewicht gegenüber exakten
+    PREFIX_MIN_LENGTH = 4
+    PREFIX_WEIGHT = 0.5
+    
+    def __init__(self, chunks, pinned=(), embeddings=None, embedding_model='', k1=1.5, b=0.75, fallback=()):
+        self.chunks = chunks
+        self.embeddings = embeddings
+        self.embedding_model = embedding_model
+        self.k1 = k1
+        self.b = b
+        self.pinned = self._matching_headings(pinned)
+        self.fallback = self._matching_headings(fallback) - self.pinned
+        self.term_freqs = [Counter(tokenize(chunk.text)) for chunk in chunks]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(chunks)) if chunks else 0
+        doc_freq = Counter()
+        for tf in self.term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(chunks)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+        self.vocabulary = sorted(self.idf)
+    
+    def _matching_headings(self, headings):
+        """Indizes der Abschnitte, deren Überschrift einen der Teilstrings enthält."""
+        return frozenset(
+            i for i, chunk in enumerate(self.chunks)
+            if any(h.lower() in chunk.heading.lower() for h in headings)
         )
-        
-        with urllib.request.urlopen(req, timeout=120) as response:
-            data = json.loads(response.read().decode('utf-8'))
-            return data.get('message', {}).get('content', 'Entschuldigung, ich konnte keine Antwort generieren.')
     
-    except urllib.error.URLError as e:
-        print(f"❌ Ollama Verbindungsfehler: {e}")
-        raise Exception(f"Ollama nicht erreichbar. Ist Ollama gestartet? ({ollama_url})")
-    except Exception as e:
-        print(f"❌ Ollama Fehler: {e}")
-        raise
+    def expand(self, term):
+        """Index-Begriffe zu einem Suchbegriff mit Gewicht (exakt oder Teil eines Kompositums)."""
+        matches = {term: 1.0} if term in self.idf else {}
+        if len(term) < self.PREFIX_MIN_LENGTH:
+            return matches
+        # Komposita, die mit dem Begriff beginnen
+        i = bisect.bisect_left(self.vocabulary, term)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(term):
+            matches.setdefault(self.vocabulary[i], self.PREFIX_WEIGHT)
+            i += 1
+        # Wortanfänge des Begriffs, die selbst im Index stehen
+        for length in range(self.PREFIX_MIN_LENGTH, len(term)):
+            if term[:length] in self.idf:
+                matches.setdefault(term[:length], self.PREFIX_WEIGHT)
+        # Komposita, die mit dem Begriff enden (ab einem Zeichen mehr, sonst zu unscharf)
+        if len(term) > self.PREFIX_MIN_LENGTH:
+            for candidate in self.vocabulary:
+                if candidate.endswith(term) and candidate != term:
+                    matches.setdefault(candidate, self.PREFIX_WEIGHT)
+        return matches
+    
+    def bm25_scores(self, query):
+        terms = set(tokenize(query))
+        for term in list(terms):
+            terms.update(SEARCH_SYNONYMS.get(term, ()))
+        weights = {}
+        for term in terms:
+            for match, weight in self.expand(term).items():
+                weights[match] = max(weight, weights.get(match, 0))
+        scores = []
+        for tf, length in zip(self.term_freqs, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1))
+            for term, weight in weights.items():
+                f = tf.get(term)
+                if f:
+                    score += weight * self.idf[term] * f * (self.k1 + 1) / (f + norm)
+            scores.append(score)
+        return scores
+    
+    def search(self, query, top_k, query_embedding=None):
+        """Liefert die Indizes der top_k relevantesten Abschnitte (ohne angepinnte)."""
+        scores = self.bm25_scores(query)
+        best = max(scores) if scores else 0
+        if best > 0:
+            scores = [score / best for score in scores]
+        if query_embedding and self.embeddings:
+            scores = [
+                (score + cosine_similarity(query_embedding, emb)) / 2
+                for score, emb in zip(scores, self.embeddings)
+            ]
+        ranked = sorted(
+            (i for i in range(len(self.chunks)) if i not in self.pinned and scores[i] > 0),
+            key=lambda i: (-scores[i], i)
+        )
+        return ranked[:top_k]
+    
+    def context_for(self, query, top_k, settings=None):
+        """Baut den Wissensbasis-Abschnitt für den Prompt (in Dokument-Reihenfolge)."""
+        query_embedding = None
+        if self.embeddings and settings is not None:
+            try:
+                query_embedding = fetch_embedding(settings, self.embedding_model, query)
+            except Exception as e:
+                log.warning('Embedding für Anfrage fehlgeschlagen, nutze nur BM25', error=str(e))
+        
+        found = self.search(query, top_k, query_embedding) or self.fallback
+        selected = sorted(self.pinned.union(found))
+        if not selected:
+            return ''
+        return '\n\n---\n\n# WISSENSBASIS (AUSZUG)\n\n' + '\n\n'.join(self.chunks[i].text for i in selected)
 
 
-class ChatbotHandler(BaseHTTPRequestHandler):
-    """HTTP Request Handler für den Chatbot."""
+# Dateien, aus denen der System-Prompt und die Live-Daten gebaut werden
+PROMPT_SOURCE_FILES = (
+    'content.json',
+    'chatbot-system-prompt.md',
+    'chatbot-system-prompt.txt',
+    'chatbot-wissensbasis.md',
+)
+
+# Unveränderlicher Stand von Einstellungen, System-Prompt und Live-Daten
+PromptSnapshot = namedtuple('PromptSnapshot', ['settings', 'system_prompt', 'live_context', 'knowledge_index', 'fingerprint'])
+
+
+class PromptCache:
+    """Hält einen fertig gebauten PromptSnapshot im Speicher.
     
-    def log_message(self, format, *args):
-        """Überschreibt Standard-Logging für besseres Format."""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        print(f"[{timestamp}] {args[0]}")
+    Der Snapshot wird nur neu gebaut, wenn sich mtime/Größe einer Quelldatei
+    ändern und der Inhalt tatsächlich einen anderen Hash hat. Läuft der
+    Watcher-Thread, macht der Request-Pfad gar keine Datei-I/O mehr.
+    """
     
-    def send_cors_headers(self):
-        """Sendet CORS-Header für Cross-Origin-Requests."""
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Session-ID')
+    def __init__(self, interval=PROMPT_WATCH_INTERVAL, knowledge_mode=KNOWLEDGE_MODE,
+                 knowledge_pinned=None, embedding_model=EMBEDDING_MODEL, knowledge_fallback=None):
+        self.interval = interval
+        self.knowledge_mode = knowledge_mode
+        if knowledge_pinned is None:
+            knowledge_pinned = [h.strip() for h in KNOWLEDGE_PINNED.split(',') if h.strip()]
+        self.knowledge_pinned = knowledge_pinned
+        if knowledge_fallback is None:
+            knowledge_fallback = [h.strip() for h in KNOWLEDGE_FALLBACK.split(',') if h.strip()]
+        self.knowledge_fallback = knowledge_fallback
+        self.embedding_model = embedding_model
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._signature = None
+        self._content_hash = None
+        self._stop = threading.Event()
+        self._watcher = None
+        self._listeners = []
+        self.rebuilds = 0
     
-    def send_json_response(self, data, status=200):
-        """Sendet JSON-Response."""
-        self.send_response(status)
-        self.send_header('Content-Type', 'application/json; charset=utf-8')
-        self.send_cors_headers()
-        self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+    def _current_signature(self):
+        """Liefert (Name, mtime, Größe) aller Quelldateien - nur stat(), kein Lesen."""
+        signature = []
+        for name in PROMPT_SOURCE_FILES:
+            try:
+                st = (DATA_DIR / name).stat()
+                signature.append((name, st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append((name, None, None))
+        return tuple(signature)
     
-    def do_OPTIONS(self):
-        """Behandelt CORS Preflight-Requests."""
-        self.send_response(204)
-        self.send_cors_headers()
-        self.end_headers()
+    def _read_sources(self):
+        """Liest alle Quelldateien roh ein und berechnet ihren gemeinsamen Hash."""
+        digest = hashlib.sha256()
+        raw = {}
+        for name in PROMPT_SOURCE_FILES:
+            try:
+                raw[name] = (DATA_DIR / name).read_bytes()
+            except OSError:
+                raw[name] = None
+            digest.update(name.encode('utf-8'))
+            digest.update(b'\0' if raw[name] is None else raw[name])
+        return raw, digest.hexdigest()
     
-    def do_GET(self):
-        """Behandelt GET-Requests."""
-        parsed = urlparse(self.path)
-        
-        if parsed.path == '/health':
-            # Health-Check Endpoint
-            self.send_json_response({
-                'status': 'ok',
-                'service': 'chatbot',
-                'timestamp': datetime.now().isoformat(),
-                'sessions_active': len(sessions)
-            })
-        
-        elif parsed.path == '/config':
-            # Gibt aktuelle Konfiguration zurück (ohne sensible Daten)
-            settings = load_chatbot_settings()
-            self.send_json_response({
-                'enabled': settings.get('enabled', True),
-                'model': settings.get('ollamaModel', OLLAMA_MODEL),
-                'ollama_url': settings.get('ollamaUrl', OLLAMA_URL),
-                'max_tokens': settings.get('maxTokens', MAX_TOKENS),
-                'temperature': settings.get('temperature', TEMPERATURE),
-            })
+    def _build(self, raw):
+        """Baut einen neuen Snapshot aus den gelesenen Bytes (ohne weitere Datei-I/O).
         
-        elif parsed.path == '/test-ollama':
-            # Testet Ollama-Verbindung
-            settings = load_chatbot_settings()
-            ollama_url = settings.get('ollamaUrl', OLLAMA_URL)
+        So passt der Snapshot immer zum Hash, unter dem er abgelegt wird;
+        content.json wird dabei nur einmal geparst.
+        """
+        content = None
+        if raw.get('content.json') is not None:
             try:
-                req = urllib.request.Request(f"{ollama_url}/api/tags", method='GET')
-                with urllib.request.urlopen(req, timeout=5) as response:
-                    data = json.loads(response.read().decode('utf-8'))
-                    models = [m.get('name', 'unknown') for m in data.get('models', [])]
-                    self.send_json_response({
-                        'success': True,
-                        'message': 'Ollama ist erreichbar',
-                        'available_models': models,
-                        'configured_model': settings.get('ollamaModel', OLLAMA_MODEL)
-                    })
+                content = json.loads(raw['content.json'].decode('utf-8'))
             except Exception as e:
-                self.send_json_response({
-                    'success': False,
-                    'error': f'Ollama nicht erreichbar: {str(e)}',
-                    'ollama_url': ollama_url,
-                    'hint': 'Stelle sicher, dass Ollama gestartet ist (ollama serve)'
-                }, status=503)
+                log.warning('content.json konnte nicht geladen werden', error=str(e))
+        
+        settings = load_chatbot_settings(content if content is not None else {})
+        live_context = get_live_data_context(content) if content is not None else ''
         
+        knowledge_index = None
+        knowledge_base = ''
+        if self.knowledge_mode == 'retrieval':
+            system_prompt = load_system_prompt(settings, include_knowledge=False, sources=raw)
+            knowledge_base = load_knowledge_base(raw)
+            if knowledge_base:
+                knowledge_index = self._build_index(knowledge_base, settings)
         else:
-            self.send_json_response({'error': 'Not found'}, status=404)
-    
-    def do_POST(self):
-        """Behandelt POST-Requests."""
-        parsed = urlparse(self.path)
+            system_prompt = load_system_prompt(settings, sources=raw)
         
-        if parsed.path == '/chat':
+        fingerprint = hashlib.sha256(
+            (system_prompt + '\0' + live_context + '\0' + knowledge_base).encode('utf-8')
+        ).hexdigest()[:16]
+        return PromptSnapshot(MappingProxyType(settings), system_prompt, live_context, knowledge_index, fingerprint)
+    
+    def _build_index(self, knowledge_base, settings):
+        """Baut den Suchindex über die Wissensbasis (optional mit Embeddings)."""
+        chunks = split_knowledge_base(knowledge_base)
+        embeddings = None
+        if self.embedding_model:
             try:
-                # Body lesen
-                content_length = int(self.headers.get('Content-Length', 0))
-                if content_length > 1024 * 1024:  # Max 1MB
-                    self.send_json_response({'error': 'Request too large'}, status=413)
-                    return
-                
-                body = self.rfile.read(content_length)
-                data = json.loads(body.decode('utf-8'))
-                
-                message = data.get('message', '').strip()
-                if not message:
-                    self.send_json_response({'error': 'Keine Nachricht angegeben'}, status=400)
-                    return
-                
-                # Session-ID aus Header oder Body
-                session_id = self.headers.get('X-Session-ID') or data.get('session_id')
-                
-                # Neue Session erstellen oder bestehende verwenden
-                if not session_id or session_id not in sessions:
-                    session_id = str(uuid.uuid4())
-                    sessions[session_id] = {
-                        'messages': [],
-                        'created_at': datetime.now(),
-                        'last_activity': datetime.now()
-                    }
-                    print(f"🆕 Neue Session erstellt: {session_id[:8]}...")
-                
-                session = sessions[session_id]
-                session['last_activity'] = datetime.now()
-                
-                # Nachricht zur Historie hinzufügen
-                session['messages'].append({
-                    'role': 'user',
-                    'content': message
-                })
-                
-                # Ollama aufrufen mit vollständiger Konversationshistorie
-                response_text = call_ollama(session['messages'], session_id)
-                
-                # Antwort zur Historie hinzufügen
-                session['messages'].append({
-                    'role': 'assistant',
-                    'content': response_text
-                })
-                
-                # Alte Sessions aufräumen
-                cleanup_old_sessions()
-                
-                self.send_json_response({
-                    'response': response_text,
-                    'session_id': session_id
-                })
-                
-            except json.JSONDecodeError:
-                self.send_json_response({'error': 'Ungültiges JSON'}, status=400)
+                embeddings = load_chunk_embeddings(chunks, settings, self.embedding_model)
             except Exception as e:
-                print(f"❌ Chat-Fehler: {e}")
-                self.send_json_response({
-                    'error': str(e),
-                    'hint': 'Überprüfe die Ollama-Konfiguration in den Admin-Einstellungen'
-                }, status=500)
+                log.warning('Embeddings nicht verfügbar, nutze nur BM25', error=str(e))
+        log.info('Wissensbasis indexiert', chunks=len(chunks), embeddings=bool(embeddings))
+        return KnowledgeIndex(chunks, self.knowledge_pinned, embeddings, self.embedding_model,
+                              fallback=self.knowledge_fallback)
+    
+    def refresh(self, force=False):
+        """Prüft die Quelldateien und baut den Snapshot bei Bedarf neu."""
+        signature = self._current_signature()
+        if not force and signature == self._signature and self._snapshot is not None:
+            return self._snapshot
         
-        elif parsed.path == '/clear-session':
-            # Session löschen
+        with self._lock:
+            if not force and signature == self._signature and self._snapshot is not None:
+                return self._snapshot
+            
+            previous = self._snapshot
+            raw, content_hash = self._read_sources()
+            if force or content_hash != self._content_hash or self._snapshot is None:
+                self._snapshot = self._build(raw)
+                self._content_hash = content_hash
+                self.rebuilds += 1
+                log.info('Prompt-Snapshot neu gebaut', fingerprint=self._snapshot.fingerprint)
+            self._signature = signature
+            snapshot = self._snapshot
+        
+        if snapshot is not previous:
+            for listener in self._listeners:
+                listener(previous, snapshot)
+        return snapshot
+    
+    def add_listener(self, listener):
+        """Registriert listener(alter_snapshot, neuer_snapshot) für Änderungen."""
+        self._listeners.append(listener)
+    
+    def get(self):
+        """Liefert den aktuellen Snapshot.
+        
+        Ohne Watcher wird bei jedem Aufruf per stat() auf Änderungen geprüft.
+        """
+        if self._watcher is None or self._snapshot is None:
+            return self.refresh()
+        return self._snapshot
+    
+    def start_watcher(self):
+        """Startet den Hintergrund-Thread, der die Quelldateien überwacht."""
+        self.refresh()
+        if self.interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, name='prompt-watcher', daemon=True)
+        self._watcher.start()
+    
+    def stop_watcher(self):
+        self._stop.set()
+    
+    def _watch(self):
+        while not self._stop.wait(self.interval):
             try:
-                content_length = int(self.headers.get('Content-Length', 0))
-                body = self.rfile.read(content_length)
-                data = json.loads(body.decode('utf-8'))
-                
-                session_id = self.headers.get('X-Session-ID') or data.get('session_id')
-                
-                if session_id and session_id in sessions:
-                    del sessions[session_id]
-                    print(f"🗑️  Session {session_id[:8]}... gelöscht")
-                    self.send_json_response({'success': True, 'message': 'Session gelöscht'})
-                else:
-                    self.send_json_response({'success': True, 'message': 'Session nicht gefunden'})
-                    
+                self.refresh()
             except Exception as e:
-                self.send_json_response({'error': str(e)}, status=500)
-        
-        else:
-            self.send_json_response({'error': 'Not found'}, status=404)
+                log.warning('Prompt-Snapshot konnte nicht aktualisiert werden', error=str(e))
 
 
-def main():
-    """Hauptfunktion - startet den Server."""
-    print("=" * 60)
-    print("🤖 KernelFlow Chatbot Backend Server")
-    print("=" * 60)
+prompt_cache = PromptCache()
+
+# Anzahl Wissensbasis-Abschnitte pro Anfrage (wird in main() überschrieben)
+knowledge_top_k = KNOWLEDGE_TOP_K
+
+
+def sanitize_text(text):
+    """Bereinigt Benutzereingaben."""
+    if not text:
+        return ''
+    # Entferne potenziell gefährliche Zeichen
+    text = re.sub(r'[<>]', '', text)
+    text = re.sub(r'javascript:', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'on\w+=', '', text, flags=re.IGNORECASE)
+    return text.strip()
+
+
+# Eine Chat-Nachricht; als Tuple deutlich kompakter als ein dict pro Nachricht
+ChatMessage = namedtuple('ChatMessage', ['role', 'content'])
+
+
+class Session:
+    """Gesprächszustand eines Besuchers."""
     
-    # Konfiguration laden
-    config = load_config()
-    settings = load_chatbot_settings()
+    __slots__ = ('session_id', 'messages', 'summary', 'summarizing', 'created_at', 'last_activity', 'size')
     
-    print(f"\n📋 Konfiguration:")
-    print(f"   Port: {CHATBOT_PORT}")
-    print(f"   Ollama URL: {settings.get('ollamaUrl', config['ollama_url'])}")
-    print(f"   Modell: {settings.get('ollamaModel', config['ollama_model'])}")
-    print(f"   Max Tokens: {settings.get('maxTokens', config['max_tokens'])}")
-    print(f"   Temperature: {settings.get('temperature', config['temperature'])}")
+    def __init__(self, session_id, created_at=None):
+        self.session_id = session_id
+        self.messages = []
+        self.summary = ''
+        self.summarizing = False
+        self.created_at = created_at or time.time()
+        self.last_activity = self.created_at
+        # Ungefährer Speicherbedarf in Zeichen (Nachrichten + Zusammenfassung)
+        self.size = 0
+
+
+class SessionStore:
+    """In-Memory Session-Speicher (wird bei Server-Neustart gelöscht).
     
-    # Teste Ollama-Verbindung
-    print(f"\n🔍 Teste Ollama-Verbindung...")
-    try:
-        ollama_url = settings.get('ollamaUrl', config['ollama_url'])
-        req = urllib.request.Request(f"{ollama_url}/api/tags", method='GET')
-        with urllib.request.urlopen(req, timeout=5) as response:
-            data = json.loads(response.read().decode('utf-8'))
-            models = [m.get('name', 'unknown') for m in data.get('models', [])]
-            print(f"   ✅ Ollama erreichbar!")
-            print(f"   📦 Verfügbare Modelle: {', '.join(models) if models else 'Keine'}")
-            
-            model = settings.get('ollamaModel', config['ollama_model'])
-            if model not in models:
-                print(f"   ⚠️  Konfiguriertes Modell '{model}' nicht gefunden!")
-                print(f"   💡 Installiere mit: ollama pull {model}")
-    except Exception as e:
-        print(f"   ❌ Ollama nicht erreichbar: {e}")
-        print(f"   💡 Starte Ollama mit: ollama serve")
+    Die Sessions liegen in einem OrderedDict, sortiert nach letzter Aktivität:
+    jeder Zugriff schiebt die Session ans Ende. Abgelaufene Sessions stehen
+    damit immer vorne und werden in O(1) pro Session entfernt, sowohl beim
+    Zugriff als auch vom Hintergrund-Sweeper. Wird die Session-Anzahl oder
+    der Speicherbedarf überschritten, fliegen die am längsten inaktiven
+    Sessions zuerst raus (LRU).
+    """
     
-    # Prüfe Prompt-Dateien
-    print(f"\n📄 Prompt-Dateien:")
-    prompt_md = DATA_DIR / 'chatbot-system-prompt.md'
-    prompt_txt = DATA_DIR / 'chatbot-system-prompt.txt'
-    knowledge_file = DATA_DIR / 'chatbot-wissensbasis.md'
+    def __init__(self, timeout=SESSION_TIMEOUT, max_sessions=MAX_SESSIONS,
+                 max_messages=MAX_SESSION_MESSAGES, max_memory_mb=SESSION_MEMORY_MB):
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.max_memory = int(max_memory_mb * 1024 * 1024)
+        # Schützt die Sessions und ihre Nachrichtenlisten vor parallelem Zugriff
+        self.lock = threading.RLock()
+        self._sessions = OrderedDict()
+        self._total_size = 0
+        self._stop = threading.Event()
+        self._sweeper = None
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
     
-    if prompt_md.exists():
-        print(f"   ✅ System-Prompt: chatbot-system-prompt.md")
-    elif prompt_txt.exists():
-        print(f"   ✅ System-Prompt: chatbot-system-prompt.txt")
-    else:
-        print(f"   ⚠️  Kein System-Prompt gefunden (Standard wird verwendet)")
+    def __len__(self):
+        return len(self._sessions)
     
-    if knowledge_file.exists():
-        print(f"   ✅ Wissensbasis: chatbot-wissensbasis.md")
-    else:
-        print(f"   ⚠️  Keine Wissensbasis gefunden")
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
     
-    # Server starten
-    print(f"\n🚀 Starte Server auf Port {CHATBOT_PORT}...")
-    server = HTTPServer(('0.0.0.0', CHATBOT_PORT), ChatbotHandler)
+    def get(self, session_id):
+        """Liefert eine aktive Session oder None (abgelaufene werden entfernt)."""
+        if not session_id:
+            return None
+        with self.lock:
+            session = self._sessions.get(session_id)
+            if session is not None and time.time() - session.last_activity > self.timeout:
+                self._remove(session_id)
+                self.expired += 1
+                return None
+            return session
     
-    print(f"\n✅ Server läuft!")
-    print(f"   📍 Local: http://localhost:{CHATBOT_PORT}")
-    print(f"   📍 Health: http://localhost:{CHATBOT_PORT}/health")
+    def create(self):
+        """Legt eine neue Session an und verdrängt bei Bedarf alte."""
+        with self.lock:
+            session = Session(str(uuid.uuid4()))
+            self._insert(session)
+            self.created += 1
+            return session
+    
+    def touch(self, session):
+        """Markiert die Session als aktiv (ans Ende der Ablauf-Reihenfolge)."""
+        with self.lock:
+            session.last_activity = time.time()
+            if session.session_id in self._sessions:
+                self._sessions.move_to_end(session.session_id)
+    
+    def append(self, session, role, content):
+        """Hängt eine Nachricht an; zu lange Historien verlieren die ältesten.
+        
+        Liefert die Anzahl der dabei entfernten Nachrichten.
+        """
+        with self.lock:
+            session.messages.append(ChatMessage(sys.intern(role), content))
+            self._resize(session, len(content))
+            excess = len(session.messages) - self.max_messages
+            if excess > 0:
+                self._resize(session, -sum(len(msg.content) for msg in session.messages[:excess]))
+                del session.messages[:excess]
+            self._enforce_limits()
+            return max(excess, 0)
+    
+    def apply_summary(self, session, summary, summarized):
+        """Ersetzt die zusammengefassten Nachrichten durch die Zusammenfassung."""
+        with self.lock:
+            # Nachrichten können inzwischen wegen max_messages entfernt worden sein
+            count = next((i + 1 for i, msg in enumerate(session.messages) if msg is summarized[-1]), 0)
+            removed = sum(len(msg.content) for msg in session.messages[:count])
+            del session.messages[:count]
+            self._resize(session, len(summary) - len(session.summary) - removed)
+            session.summary = summary
+    
+    def delete(self, session_id):
+        """Löscht eine Session; liefert True, falls sie existierte."""
+        with self.lock:
+            return self._remove(session_id) is not None
+    
+    def sweep(self):
+        """Entfernt abgelaufene Sessions (nur vom Anfang der Reihenfolge)."""
+        cutoff = time.time() - self.timeout
+        removed = 0
+        with self.lock:
+            while self._sessions:
+                session_id, session = next(iter(self._sessions.items()))
+                if session.last_activity > cutoff:
+                    break
+                self._remove(session_id)
+                removed += 1
+            self.expired += removed
+        if removed:
+            log.info('Abgelaufene Sessions entfernt', count=removed)
+        return removed
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'backend': 'memory',
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'memory_bytes': self._total_size,
+                'max_memory_bytes': self.max_memory,
+                'created': self.created,
+                'expired': self.expired,
+                'evicted': self.evicted,
+            }
+    
+    def start_sweeper(self, interval=SESSION_SWEEP_INTERVAL):
+        """Startet den Hintergrund-Thread, der abgelaufene Sessions entfernt."""
+        if interval <= 0 or self._sweeper is not None:
+            return
+        
+        def run():
+            while not self._stop.wait(interval):
+                self.sweep()
+        
+        self._sweeper = threading.Thread(target=run, name='session-sweeper', daemon=True)
+        self._sweeper.start()
+    
+    def close(self):
+        self._stop.set()
+    
+    def _resize(self, session, delta):
+        # Inhalt als UTF-8 geschätzt mit ~1 Byte pro Zeichen
+        session.size += delta
+        if self._sessions.get(session.session_id) is session:
+            self._total_size += delta
+    
+    def _insert(self, session):
+        self._sessions[session.session_id] = session
+        self._total_size += session.size
+        self._enforce_limits()
+    
+    def _remove(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._total_size -= session.size
+        return session
+    
+    def _evict(self, session_id):
+        """Verdrängt eine Session wegen der Limits (im Memory-Backend: löschen)."""
+        self._remove(session_id)
+    
+    def _enforce_limits(self):
+        """Verdrängt die am längsten inaktiven Sessions, bis die Limits passen."""
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._total_size > self.max_memory
+        ):
+            self._evict(next(iter(self._sessions)))
+            self.evicted += 1
+
+
+class SQLiteSessionStore(SessionStore):
+    """Persistenter Session-Speicher auf SQLite (WAL), überlebt Neustarts.
+    
+    Die Oberklasse dient als Hot-Cache für aktive Sessions; Verdrängen
+    entfernt eine Session nur aus dem Cache. Änderungen werden gesammelt und
+    vom Writer-Thread gebündelt in einer Transaktion geschrieben
+    (Write-Behind). Der Index auf last_activity macht das Aufräumen
+    abgelaufener Sessions zu einer Bereichsabfrage.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL DEFAULT '',
+            created_at REAL NOT NULL,
+            last_activity REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sessions_last_activity ON sessions(last_activity);
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id);
+    """
+    
+    def __init__(self, path=SESSION_DB, flush_interval=SESSION_FLUSH_INTERVAL, shared=False, **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path)
+        # Mehrere Prozesse teilen sich die Datenbank: sofort schreiben, Cache prüfen
+        self.shared = shared
+        self.flush_interval = 0 if shared else flush_interval
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('PRAGMA busy_timeout=5000')
+        self._db.executescript(self.SCHEMA)
+        # Schützt die Datenbankverbindung; Reihenfolge: self.lock vor _db_lock
+        self._db_lock = threading.Lock()
+        self._pending = []
+        self._writer = None
+        self.flushes = 0
+        self.loaded = 0
+    
+    def get(self, session_id):
+        if not session_id:
+            return None
+        with self.lock:
+            session = super().get(session_id)
+            if session is not None and self.shared and self._changed_elsewhere(session):
+                self._remove(session_id)
+                session = None
+            if session is None and session_id not in self._sessions:
+                session = self._load(session_id)
+            return session
+    
+    def create(self):
+        with self.lock:
+            session = super().create()
+            self._queue(('upsert', session.session_id, session.summary, session.created_at, session.last_activity))
+            return session
+    
+    def touch(self, session):
+        with self.lock:
+            super().touch(session)
+            self._queue(('touch', session.session_id, session.last_activity))
+    
+    def append(self, session, role, content):
+        with self.lock:
+            # Nachrichten, die super().append() wegen max_messages entfernt
+            oldest = session.messages[:max(0, len(session.messages) + 1 - self.max_messages)]
+            removed = super().append(session, role, content)
+            self._queue(('append', session.session_id, role, content))
+            if removed:
+                self._queue(('drop', session.session_id, [tuple(msg) for msg in oldest]))
+            return removed
+    
+    def apply_summary(self, session, summary, summarized):
+        with self.lock:
+            super().apply_summary(session, summary, summarized)
+            self._queue(('summary', session.session_id, summary))
+            self._queue(('drop', session.session_id, [tuple(msg) for msg in summarized]))
+            # Wurde die Session inzwischen neu geladen, ist die Kopie im Cache veraltet
+            cached = self._sessions.get(session.session_id)
+            if cached is not None and cached is not session:
+                self._remove(session.session_id)
+    
+    def delete(self, session_id):
+        with self.lock:
+            existed = super().delete(session_id) or self._load(session_id, keep=False) is not None
+            self._queue(('delete', session_id))
+            return existed
+    
+    def sweep(self):
+        removed = super().sweep()
+        cutoff = time.time() - self.timeout
+        self.flush()
+        with self._db_lock:
+            self._db.execute('BEGIN')
+            self._db.execute(
+                'DELETE FROM messages WHERE session_id IN '
+                '(SELECT session_id FROM sessions WHERE last_activity < ?)', (cutoff,)
+            )
+            self._db.execute('DELETE FROM sessions WHERE last_activity < ?', (cutoff,))
+            self._db.execute('COMMIT')
+        return removed
+    
+    def stats(self):
+        stats = super().stats()
+        with self.lock:
+            stats.update({
+                'backend': 'sqlite',
+                'cached_sessions': stats['sessions'],
+                'pending_writes': len(self._pending),
+                'flushes': self.flushes,
+                'loaded_from_disk': self.loaded,
+            })
+        return stats
+    
+    def start_sweeper(self, interval=SESSION_SWEEP_INTERVAL):
+        super().start_sweeper(interval)
+        if self._writer is None and self.flush_interval > 0:
+            def run():
+                while not self._stop.wait(self.flush_interval):
+                    try:
+                        self.flush()
+                    except Exception as e:
+                        log.warning('Sessions konnten nicht gespeichert werden', error=str(e))
+            
+            self._writer = threading.Thread(target=run, name='session-writer', daemon=True)
+            self._writer.start()
+    
+    def close(self):
+        super().close()
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+    
+    def flush(self):
+        """Schreibt alle gesammelten Änderungen in einer Transaktion."""
+        with self.lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        with self._db_lock:
+            self._db.execute('BEGIN')
+            try:
+                for op in pending:
+                    self._apply(op)
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+        self.flushes += 1
+    
+    def _apply(self, op):
+        kind, session_id = op[0], op[1]
+        if kind == 'upsert':
+            self._db.execute(
+                'INSERT OR REPLACE INTO sessions (session_id, summary, created_at, last_activity) VALUES (?, ?, ?, ?)',
+                op[1:]
+            )
+        elif kind == 'touch':
+            self._db.execute('UPDATE sessions SET last_activity = ? WHERE session_id = ?', (op[2], session_id))
+        elif kind == 'append':
+            self._db.execute(
+                'INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)', (session_id, op[2], op[3])
+            )
+        elif kind == 'summary':
+            self._db.execute('UPDATE sessions SET summary = ? WHERE session_id = ?', (op[2], session_id))
+        elif kind == 'drop':
+            # Die ältesten Nachrichten entfernen, soweit sie zu den übergebenen
+            # gehören. Die Kopie im Speicher kann veraltet sein (anderer Prozess,
+            # neu geladene Session); später angehängte Nachrichten bleiben erhalten.
+            dropped = op[2]
+            rows = self._db.execute(
+                'SELECT id, role, content FROM messages WHERE session_id = ? ORDER BY id LIMIT ?',
+                (session_id, len(dropped))
+            ).fetchall()
+            ids = []
+            position = 0
+            for message_id, role, content in rows:
+                while position < len(dropped) and dropped[position] != (role, content):
+                    position += 1
+                if position >= len(dropped):
+                    break
+                ids.append((message_id,))
+                position += 1
+            self._db.executemany('DELETE FROM messages WHERE id = ?', ids)
+        elif kind == 'delete':
+            self._db.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
+            self._db.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+    
+    def _queue(self, op):
+        self._pending.append(op)
+        if self.flush_interval <= 0:
+            self.flush()
+    
+    def _changed_elsewhere(self, session):
+        """Prüft, ob ein anderer Prozess die Session seit dem Laden verändert hat."""
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT last_activity FROM sessions WHERE session_id = ?', (session.session_id,)
+            ).fetchone()
+        return row is None or row[0] != session.last_activity
+    
+    def _evict(self, session_id):
+        # Nur aus dem Cache verdrängen, die Daten bleiben in der Datenbank
+        self._remove(session_id)
+    
+    def _load(self, session_id, keep=True):
+        """Lädt eine Session aus der Datenbank in den Cache (Aufruf mit self.lock)."""
+        self.flush()
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT summary, created_at, last_activity FROM sessions WHERE session_id = ?', (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self._db.execute(
+                'SELECT role, content FROM messages WHERE session_id = ? ORDER BY id', (session_id,)
+            ).fetchall()
+        
+        summary, created_at, last_activity = row
+        if time.time() - last_activity > self.timeout:
+            self._queue(('delete', session_id))
+            return None
+        
+        session = Session(session_id, created_at)
+        session.last_activity = last_activity
+        session.summary = summary
+        session.messages = [ChatMessage(sys.intern(role), content) for role, content in rows]
+        session.size = len(summary) + sum(len(content) for _, content in rows)
+        if keep:
+            self._insert(session)
+            self.loaded += 1
+        return session
+
+
+def create_session_store(config):
+    """Erstellt den Session-Speicher passend zur Konfiguration."""
+    options = {
+        'max_sessions': config['max_sessions'],
+        'max_messages': config['max_session_messages'],
+        'max_memory_mb': config['session_memory_mb'],
+    }
+    if config['session_backend'] == 'sqlite':
+        return SQLiteSessionStore(
+            config['session_db'], config['session_flush_interval'], shared=config['workers'] > 1, **options
+        )
+    return SessionStore(**options)
+
+
+sessions = SessionStore()
+
+
+# Bucket-Grenzen (Sekunden) der Latenz-Histogramme
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Bucket-Grenzen für Tokens pro Sekunde und Prompt-Länge in Tokens
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+PROMPT_TOKEN_BUCKETS = (128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+
+class Histogram:
+    """Kumulatives Histogramm im Prometheus-Format, optional je Label-Wert."""
+    
+    def __init__(self, name, help_text, buckets, label=None):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value, label_value=None):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items(), key=lambda item: str(item[0]))
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in series]
+        for label_value, counts, total, count in series:
+            prefix = f'{self.label}="{label_value}",' if self.label else ''
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            labels = f'{{{prefix.rstrip(",")}}}' if prefix else ''
+            lines.append(f'{self.name}_sum{labels} {total:.6f}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class ChatMetrics:
+    """Sammelt Latenzen und Zähler für den /metrics-Endpunkt.
+    
+    Phasen eines /chat-Requests: `parse` (Body lesen und parsen),
+    `prompt` (Prompt zusammenbauen), `admission` (Warten auf einen
+    Generierungs-Slot im Scheduler), `queue` (Warten auf eine freie
+    Ollama-Verbindung), `first_token` (Request-Beginn bis zum ersten
+    Token von Ollama, auch ohne Streaming zum Client) und `total`. Die
+    Werte gelten pro Prozess; im Prefork-Betrieb liefert jeder Worker
+    seine eigenen.
+    """
+    
+    def __init__(self):
+        self.phases = Histogram(
+            'chatbot_chat_phase_seconds', 'Dauer der Phasen eines /chat-Requests', LATENCY_BUCKETS, label='phase'
+        )
+        self.token_rate = Histogram(
+            'chatbot_ollama_tokens_per_second', 'Generierungsgeschwindigkeit laut eval_count/eval_duration', TOKEN_RATE_BUCKETS
+        )
+        self.prompt_tokens = Histogram(
+            'chatbot_ollama_prompt_tokens', 'Prompt-Länge in Tokens laut prompt_eval_count', PROMPT_TOKEN_BUCKETS
+        )
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.generated_tokens = 0
+        self.errors = Counter()
+        self.cancellations = Counter()
+    
+    def observe(self, phase, seconds):
+        self.phases.observe(seconds, phase)
+    
+    def observe_generation(self, data):
+        """Wertet die Statistik der letzten Ollama-Antwort (done=true) aus."""
+        eval_count = data.get('eval_count') or 0
+        eval_duration = data.get('eval_duration') or 0
+        if eval_count and eval_duration:
+            self.token_rate.observe(eval_count / (eval_duration / 1e9))
+        if data.get('prompt_eval_count'):
+            self.prompt_tokens.observe(data['prompt_eval_count'])
+        with self._lock:
+            self.generated_tokens += eval_count
+    
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+    
+    def request_finished(self):
+        with self._lock:
+            self.in_flight -= 1
+    
+    def error(self, kind):
+        with self._lock:
+            self.errors[kind] += 1
+    
+    def cancelled(self, reason):
+        with self._lock:
+            self.cancellations[reason] += 1
+    
+    def render(self):
+        """Liefert alle Metriken im Prometheus-Textformat."""
+        with self._lock:
+            in_flight, requests, generated = self.in_flight, self.requests, self.generated_tokens
+            errors = sorted(self.errors.items())
+            cancellations = sorted(self.cancellations.items())
+        lines = [
+            '# HELP chatbot_chat_requests_in_flight Laufende /chat-Requests',
+            '# TYPE chatbot_chat_requests_in_flight gauge',
+            f'chatbot_chat_requests_in_flight {in_flight}',
+            '# HELP chatbot_chat_requests_total Angenommene /chat-Requests',
+            '# TYPE chatbot_chat_requests_total counter',
+            f'chatbot_chat_requests_total {requests}',
+            '# HELP chatbot_ollama_generated_tokens_total Von Ollama generierte Tokens',
+            '# TYPE chatbot_ollama_generated_tokens_total counter',
+            f'chatbot_ollama_generated_tokens_total {generated}',
+            '# HELP chatbot_errors_total Fehler nach Typ',
+            '# TYPE chatbot_errors_total counter',
+        ]
+        lines.extend(f'chatbot_errors_total{{type="{kind}"}} {count}' for kind, count in errors)
+        lines.extend([
+            '# HELP chatbot_generation_cancellations_total Abgebrochene Ollama-Generierungen nach Grund',
+            '# TYPE chatbot_generation_cancellations_total counter',
+        ])
+        lines.extend(f'chatbot_generation_cancellations_total{{reason="{reason}"}} {count}' for reason, count in cancellations)
+        lines.extend(self.phases.render())
+        lines.extend(self.token_rate.render())
+        lines.extend(self.prompt_tokens.render())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = ChatMetrics()
+
+
+# Fehler, an denen eine vom Server geschlossene Keep-Alive-Verbindung erkennbar ist
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+class OllamaHTTPError(Exception):
+    """Ollama hat mit einem HTTP-Fehlerstatus geantwortet (4xx: Fehler im Request)."""
+    
+    def __init__(self, status, body=b''):
+        super().__init__(f"Ollama antwortete mit HTTP {status}: {body[:200].decode('utf-8', 'replace')}")
+        self.status = status
+
+
+class OllamaServerError(OllamaHTTPError):
+    """HTTP 5xx: Fehler des Backends; zählt gegen das Backend, ein anderes wird versucht."""
+
+
+class PoolExhausted(Exception):
+    """Alle Verbindungen zu einem Backend sind belegt (lokale Grenze, kein Backend-Fehler)."""
+
+
+def ollama_http_error(status, body):
+    return (OllamaServerError if status >= 500 else OllamaHTTPError)(status, body)
+
+
+# Fehler, nach denen ein Backend als gestört gilt und ein anderes versucht wird
+BACKEND_ERRORS = (OSError, http.client.HTTPException, OllamaServerError)
+
+# Einstellungen für neu angelegte Verbindungspools (werden in main() überschrieben)
+ollama_pool_options = {
+    'size': OLLAMA_POOL_SIZE,
+    'connect_timeout': OLLAMA_CONNECT_TIMEOUT,
+    'read_timeout': OLLAMA_READ_TIMEOUT,
+    'retries': OLLAMA_RETRIES,
+}
+
+# Ein Pool pro Ollama-Basis-URL
+ollama_pools = {}
+ollama_pools_lock = threading.Lock()
+
+
+class OllamaConnectionPool:
+    """Persistente HTTP/1.1-Verbindungen zu einer Ollama-Instanz.
+    
+    Höchstens `size` Verbindungen sind gleichzeitig in Benutzung, weitere
+    Aufrufe warten auf eine freie (oder geben mit wait=False sofort auf). Schlägt ein Request auf einer
+    wiederverwendeten Verbindung fehl, bevor eine Antwort kam (Ollama hat
+    sie inzwischen geschlossen), wird er auf einer frischen wiederholt.
+    """
+    
+    def __init__(self, base_url, size=8, connect_timeout=5, read_timeout=120, retries=1):
+        parsed = urlparse(base_url)
+        self.base_url = base_url
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port
+        self.base_path = parsed.path.rstrip('/')
+        self.connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+        self.size = size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connections_created = 0
+        self.stale_retries = 0
+    
+    def _connect(self):
+        conn = self.connection_class(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        self.connections_created += 1
+        return conn
+    
+    def _checkout(self):
+        """Liefert (Verbindung, wiederverwendet?) - bevorzugt eine offene."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._connect(), False
+    
+    def _checkin(self, conn, response):
+        """Gibt die Verbindung zurück in den Pool, falls sie weiter nutzbar ist."""
+        if conn is not None:
+            if response is not None and not response.will_close and response.isclosed():
+                with self._lock:
+                    self._idle.append(conn)
+            else:
+                conn.close()
+        self._slots.release()
+    
+    def _open(self, method, path, body, timeout, wait=True):
+        """Sendet den Request und liefert (Verbindung, Response).
+        
+        Der Aufrufer muss die Verbindung mit _checkin() zurückgeben.
+        """
+        waited = time.monotonic()
+        acquired = self._slots.acquire(timeout=self.read_timeout) if wait else self._slots.acquire(blocking=False)
+        if not acquired:
+            raise PoolExhausted(f"Keine freie Verbindung zu {self.base_url}")
+        if path == '/api/chat':
+            metrics.observe('queue', time.monotonic() - waited)
+        
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        attempts = 0
+        while True:
+            conn, reused = None, False
+            try:
+                conn, reused = self._checkout()
+                conn.sock.settimeout(timeout or self.read_timeout)
+                conn.request(method, self.base_path + path, body=body, headers=headers)
+                return conn, conn.getresponse()
+            except STALE_CONNECTION_ERRORS:
+                if conn is not None:
+                    conn.close()
+                if not reused or attempts >= self.retries:
+                    self._slots.release()
+                    raise
+                attempts += 1
+                self.stale_retries += 1
+            except BaseException:
+                if conn is not None:
+                    conn.close()
+                self._slots.release()
+                raise
+    
+    def request(self, method, path, payload=None, timeout=None, wait=True):
+        """Führt einen Request aus und liefert die geparste JSON-Antwort."""
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        conn, response = self._open(method, path, body, timeout, wait)
+        try:
+            raw = response.read()
+        except BaseException:
+            self._checkin(None, None)
+            conn.close()
+            raise
+        self._checkin(conn, response)
+        
+        if response.status >= 400:
+            raise ollama_http_error(response.status, raw)
+        return json.loads(raw.decode('utf-8'))
+    
+    def stream(self, method, path, payload=None, timeout=None, wait=True):
+        """Führt einen Request aus und liefert die Antwort zeilenweise (NDJSON)."""
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        conn, response = self._open(method, path, body, timeout, wait)
+        completed = False
+        try:
+            if response.status >= 400:
+                raw = response.read()
+                completed = True
+                raise ollama_http_error(response.status, raw)
+            
+            for line in response:
+                line = line.strip()
+                if line:
+                    yield json.loads(line.decode('utf-8'))
+            completed = True
+        finally:
+            # Nur vollständig gelesene Antworten dürfen die Verbindung zurückgeben
+            if completed:
+                self._checkin(conn, response)
+            else:
+                conn.close()
+                self._checkin(None, None)
+    
+    def probe(self, path, timeout=5):
+        """GET auf einer eigenen Verbindung, ohne auf einen Slot zu warten.
+        
+        Für Health-Checks: Sind alle Slots mit langen Generierungen belegt,
+        ist das Backend ausgelastet, aber nicht gestört.
+        """
+        conn = self.connection_class(self.host, self.port, timeout=timeout)
+        try:
+            conn.request('GET', self.base_path + path)
+            response = conn.getresponse()
+            raw = response.read()
+        finally:
+            conn.close()
+        if response.status >= 400:
+            raise ollama_http_error(response.status, raw)
+        return json.loads(raw.decode('utf-8'))
+    
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def get_ollama_pool(base_url):
+    """Liefert den Verbindungspool für eine Ollama-URL (wird bei Bedarf angelegt)."""
+    pool = ollama_pools.get(base_url)
+    if pool is None:
+        with ollama_pools_lock:
+            pool = ollama_pools.get(base_url)
+            if pool is None:
+                pool = OllamaConnectionPool(base_url, **ollama_pool_options)
+                ollama_pools[base_url] = pool
+    return pool
+
+
+class OllamaBackend:
+    """Zustand einer Ollama-Instanz im BackendPool."""
+    
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True
+        self.outstanding = 0
+        self.failures = 0
+        self.requests = 0
+        self.last_error = ''
+
+
+class BackendPool:
+    """Verteilt Requests auf mehrere Ollama-Instanzen.
+    
+    Gewählt wird das gesunde Backend mit den wenigsten offenen Requests.
+    Eine Session bleibt bei ihrem bisherigen Backend (dessen KV-Cache ihren
+    Prompt schon kennt), solange es nicht deutlich stärker ausgelastet ist.
+    Nach `max_failures` Fehlern in Folge wird ein Backend ausgeklinkt, bis
+    der Health-Check (/api/tags) wieder erfolgreich ist.
+    """
+    
+    # Offene Requests, die ein Backend mehr haben darf, bevor die Session-Affinität aufgegeben wird
+    AFFINITY_SLACK = 2
+    # Maximale Anzahl gemerkter Session-Zuordnungen
+    AFFINITY_LIMIT = 10000
+    
+    def __init__(self, max_failures=OLLAMA_MAX_FAILURES):
+        self.max_failures = max_failures
+        self._backends = []
+        self._urls = ()
+        self._affinity = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._checker = None
+        self.retries = 0
+    
+    def sync(self, urls):
+        """Übernimmt die konfigurierte Backend-Liste (Zustand bestehender bleibt erhalten)."""
+        urls = tuple(urls)
+        if urls == self._urls:
+            return
+        with self._lock:
+            existing = {backend.url: backend for backend in self._backends}
+            self._backends = [existing.get(url) or OllamaBackend(url) for url in urls]
+            self._urls = urls
+    
+    def all(self):
+        with self._lock:
+            return list(self._backends)
+    
+    def choose(self, session_id=None, exclude=()):
+        """Wählt ein Backend; None, wenn keines (mehr) in Frage kommt."""
+        with self._lock:
+            candidates = [b for b in self._backends if b not in exclude]
+            healthy = [b for b in candidates if b.healthy]
+            # Sind alle ausgeklinkt, trotzdem versuchen statt sofort aufzugeben
+            candidates = healthy or candidates
+            if not candidates:
+                return None
+            
+            best = min(candidates, key=lambda b: b.outstanding)
+            preferred_url = self._affinity.get(session_id) if session_id else None
+            for backend in candidates:
+                if backend.url == preferred_url and backend.outstanding <= best.outstanding + self.AFFINITY_SLACK:
+                    best = backend
+                    break
+            
+            if session_id:
+                self._affinity[session_id] = best.url
+                self._affinity.move_to_end(session_id)
+                while len(self._affinity) > self.AFFINITY_LIMIT:
+                    self._affinity.popitem(last=False)
+            best.outstanding += 1
+            best.requests += 1
+            return best
+    
+    def release(self, backend, error=None):
+        """Meldet das Ende eines Requests; Verbindungs- und 5xx-Fehler zählen gegen das Backend."""
+        with self._lock:
+            backend.outstanding -= 1
+            if error is None:
+                backend.failures = 0
+                return
+            backend.failures += 1
+            backend.last_error = str(error)
+            if backend.healthy and backend.failures >= self.max_failures:
+                backend.healthy = False
+                log.warning('Ollama-Backend ausgeklinkt', backend=backend.url, error=str(error))
+    
+    def health_check(self):
+        """Prüft alle Backends über /api/tags."""
+        for backend in self.all():
+            try:
+                get_ollama_pool(backend.url).probe('/api/tags', timeout=5)
+                with self._lock:
+                    if not backend.healthy:
+                        log.info('Ollama-Backend wieder verfügbar', backend=backend.url)
+                    backend.healthy = True
+                    backend.failures = 0
+            except Exception as e:
+                with self._lock:
+                    if backend.healthy:
+                        log.warning('Ollama-Backend ausgeklinkt', backend=backend.url, error=str(e))
+                    backend.healthy = False
+                    backend.last_error = str(e)
+    
+    def start_health_checks(self, interval=OLLAMA_HEALTH_INTERVAL):
+        if interval <= 0 or self._checker is not None:
+            return
+        
+        def run():
+            while not self._stop.wait(interval):
+                self.health_check()
+        
+        self._checker = threading.Thread(target=run, name='backend-health', daemon=True)
+        self._checker.start()
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'retries': self.retries,
+                'backends': [
+                    {
+                        'url': b.url,
+                        'healthy': b.healthy,
+                        'outstanding': b.outstanding,
+                        'requests': b.requests,
+                        'failures': b.failures,
+                        'last_error': b.last_error,
+                    }
+                    for b in self._backends
+                ],
+            }
+
+
+backends = BackendPool()
+
+# Zusätzliche Backend-URLs aus config.json / OLLAMA_URLS (werden in main() überschrieben)
+backend_options = {
+    'urls': [u.strip() for u in OLLAMA_URLS.split(',') if u.strip()],
+}
+
+
+def backend_urls(settings):
+    """Liste der Ollama-URLs: ollamaUrls (Admin), sonst config.json/OLLAMA_URLS, sonst ollamaUrl."""
+    urls = settings.get('ollamaUrls') or backend_options['urls'] or [settings.get('ollamaUrl', OLLAMA_URL)]
+    unique = []
+    for url in urls:
+        url = str(url).strip().rstrip('/')
+        if url and url not in unique:
+            unique.append(url)
+    return unique
+
+
+def ollama_request(settings, method, path, payload=None, timeout=None, session_id=None):
+    """Führt einen Request auf einem Backend aus; bei Verbindungs- und 5xx-Fehlern auf dem nächsten.
+    
+    Sind alle Verbindungen eines Backends belegt, wird ebenfalls das nächste
+    versucht, ohne dass das gegen das Backend zählt. Gewartet wird auf eine
+    freie Verbindung erst, wenn alle Backends voll sind.
+    """
+    backends.sync(backend_urls(settings))
+    tried = []
+    busy = []
+    wait = False
+    last_error = None
+    while True:
+        backend = backends.choose(session_id, exclude=tried)
+        if backend is None and busy and not wait:
+            # Alle voll: jetzt auf dem am wenigsten belasteten warten
+            tried = [b for b in tried if b not in busy]
+            wait = True
+            continue
+        if backend is None:
+            raise last_error or Exception('Kein Ollama-Backend konfiguriert')
+        if tried:
+            backends.retries += 1
+        tried.append(backend)
+        try:
+            result = get_ollama_pool(backend.url).request(method, path, payload, timeout, wait)
+        except PoolExhausted as e:
+            backends.release(backend)
+            if wait:
+                raise
+            busy.append(backend)
+            last_error = e
+            continue
+        except BACKEND_ERRORS as e:
+            backends.release(backend, e)
+            last_error = e
+            continue
+        except BaseException:
+            backends.release(backend)
+            raise
+        backends.release(backend)
+        return result
+
+
+def ollama_stream(settings, path, payload, session_id=None):
+    """Wie ollama_request, aber als NDJSON-Stream.
+    
+    Gewechselt wird nur, solange noch nichts beim Client angekommen ist.
+    """
+    backends.sync(backend_urls(settings))
+    tried = []
+    busy = []
+    wait = False
+    last_error = None
+    while True:
+        backend = backends.choose(session_id, exclude=tried)
+        if backend is None and busy and not wait:
+            tried = [b for b in tried if b not in busy]
+            wait = True
+            continue
+        if backend is None:
+            raise last_error or Exception('Kein Ollama-Backend konfiguriert')
+        if tried:
+            backends.retries += 1
+        tried.append(backend)
+        started = False
+        try:
+            for chunk in get_ollama_pool(backend.url).stream('POST', path, payload, wait=wait):
+                started = True
+                yield chunk
+        except PoolExhausted as e:
+            backends.release(backend)
+            if wait:
+                raise
+            busy.append(backend)
+            last_error = e
+            continue
+        except BACKEND_ERRORS as e:
+            backends.release(backend, e)
+            if started:
+                raise
+            last_error = e
+            continue
+        except BaseException:
+            backends.release(backend)
+            raise
+        backends.release(backend)
+        return
+
+
+# Einstellungen für die Gesprächshistorie (werden in main() überschrieben)
+history_options = {
+    'token_budget': HISTORY_TOKEN_BUDGET,
+    'summary_max_tokens': SUMMARY_MAX_TOKENS,
+}
+
+# Zusammenfassungen laufen nacheinander im Hintergrund, nie im Request-Pfad
+summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='summary')
+
+SUMMARY_PROMPT = (
+    "Fasse das bisherige Gespräch zwischen Besucher und Assistent in höchstens fünf Sätzen "
+    "auf Deutsch zusammen. Behalte Namen, Anliegen, genannte Services, Preise und offene "
+    "Fragen. Antworte nur mit der Zusammenfassung."
+)
+
+
+def estimate_tokens(text):
+    """Grobe Token-Schätzung (ca. 4 Zeichen pro Token)."""
+    return len(text) // 4 + 1
+
+
+def trim_history(messages, budget):
+    """Teilt die Historie in (ältere, neueste) Nachrichten.
+    
+    Die neuesten Nachrichten werden wörtlich übernommen, solange sie ins
+    Token-Budget passen; die letzte Nachricht ist immer dabei. Die behaltene
+    Historie beginnt immer mit einer Nachricht des Besuchers: Fällt der
+    Schnitt auf eine Antwort, wird die zugehörige Frage noch mitgenommen
+    (auch über das Budget hinaus), statt die Antwort wegzulassen - die
+    Zusammenfassung entsteht asynchron und fehlt beim ersten Mal noch.
+    """
+    used = 0
+    start = len(messages)
+    while start > 0:
+        cost = estimate_tokens(messages[start - 1].content)
+        if start < len(messages) and used + cost > budget:
+            break
+        used += cost
+        start -= 1
+    while start > 0 and messages[start].role != 'user':
+        start -= 1
+    return messages[:start], messages[start:]
+
+
+def summarize_messages(messages, previous_summary='', session_id=None):
+    """Lässt Ollama ältere Nachrichten (plus bisherige Zusammenfassung) zusammenfassen."""
+    settings = prompt_cache.get().settings
+    transcript = []
+    if previous_summary:
+        transcript.append(f"Bisherige Zusammenfassung: {previous_summary}")
+    for msg in messages:
+        speaker = 'Besucher' if msg.role == 'user' else 'Assistent'
+        transcript.append(f"{speaker}: {sanitize_text(msg.content)}")
+    
+    payload = {
+        'model': settings.get('ollamaModel', OLLAMA_MODEL),
+        'messages': [
+            {'role': 'system', 'content': SUMMARY_PROMPT},
+            {'role': 'user', 'content': '\n'.join(transcript)},
+        ],
+        'stream': False,
+        'keep_alive': keep_alive_value(),
+        'options': {
+            'temperature': 0.2,
+            'num_predict': history_options['summary_max_tokens'],
+        }
+    }
+    # Gleiches num_ctx wie die Chat-Requests, sonst lädt Ollama das Modell neu
+    num_ctx = context_planner.num_ctx_for(
+        sum(estimate_tokens(m['content']) for m in payload['messages']) + history_options['summary_max_tokens']
+    )
+    if num_ctx:
+        payload['options']['num_ctx'] = num_ctx
+    data = ollama_request(settings, 'POST', '/api/chat', payload, session_id=session_id)
+    return data.get('message', {}).get('content', '').strip()
+
+
+def schedule_summary(session, count):
+    """Fasst die ersten `count` Nachrichten einer Session im Hintergrund zusammen.
+    
+    Danach werden sie aus der Session entfernt, sodass Speicher und Prompt-Länge
+    auch bei langen Gesprächen konstant bleiben. Aufruf mit sessions.lock.
+    """
+    if session.summarizing or count <= 0:
+        return
+    session.summarizing = True
+    older = session.messages[:count]
+    previous_summary = session.summary
+    session_id = session.session_id
+    
+    def run():
+        try:
+            summary = summarize_messages(older, previous_summary, session_id)
+            if summary:
+                sessions.apply_summary(session, summary, older)
+            log.info('Nachrichten zusammengefasst', session=session_id[:8], count=count)
+        except Exception as e:
+            log.warning('Zusammenfassung fehlgeschlagen', session=session_id[:8], error=str(e))
+        finally:
+            with sessions.lock:
+                session.summarizing = False
+    
+    summary_executor.submit(run)
+
+
+def normalize_question(text):
+    """Normalisiert eine Frage für den Cache-Vergleich (Groß-/Kleinschreibung, Satzzeichen, Leerzeichen)."""
+    text = unicodedata.normalize('NFKC', text).lower()
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+def prompt_version(snapshot):
+    """Version aller Einflüsse auf eine Erstantwort außer der Frage selbst.
+    
+    Prompt-Fingerprint und Modell-Einstellungen; ändert sich eines davon,
+    sind gecachte bzw. vorberechnete Antworten nicht mehr gültig.
+    """
+    settings = snapshot.settings
+    parts = (
+        snapshot.fingerprint,
+        str(settings.get('ollamaModel', OLLAMA_MODEL)),
+        str(settings.get('temperature', TEMPERATURE)),
+        str(settings.get('maxTokens', MAX_TOKENS)),
+        str(knowledge_top_k),
+        f"{KnowledgeIndex.VERSION}:{','.join(prompt_cache.knowledge_pinned)}:{','.join(prompt_cache.knowledge_fallback)}",
+        prompt_options['layout'],
+        str(context_planner.maximum),
+    )
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def response_cache_key(message, snapshot):
+    """Cache-Schlüssel aus normalisierter Frage und Prompt-Version."""
+    raw = normalize_question(message) + '\0' + prompt_version(snapshot)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """LRU-Cache mit TTL für Antworten auf die erste Frage einer Session.
+    
+    Die meisten Besucher stellen dieselben Einstiegsfragen (Preise, Kontakt,
+    Services). Der Schlüssel enthält den Fingerprint des Prompt-Snapshots;
+    ändert sich dieser (content.json oder Prompt-Dateien), wird der ganze
+    Cache verworfen.
+    """
+    
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def _check_fingerprint(self, fingerprint):
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._fingerprint = fingerprint
+    
+    def get(self, key, fingerprint):
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, fingerprint, response_text):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            self._entries[key] = (response_text, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+response_cache = ResponseCache()
+
+
+class AnswerStore:
+    """Vorberechnete Antworten auf bekannte Erstfragen (JSON-Datei).
+    
+    Der Batch-Modus (--batch) schreibt die Datei, der Server liest sie beim
+    Start und bei Änderungen (geprüft höchstens alle `interval` Sekunden).
+    Die Datei gilt für genau eine Prompt-Version (siehe prompt_version());
+    passt sie nicht zum aktuellen Prompt, wird sie ignoriert, bis der
+    Batch erneut gelaufen ist.
+    """
+    
+    def __init__(self, path=ANSWER_STORE, interval=5):
+        self.path = Path(path)
+        self.interval = interval
+        self.version = None
+        self._answers = {}
+        self._mtime = None
+        self._checked = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+    
+    def load(self):
+        """Liest die Datei neu ein, falls sie sich geändert hat."""
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        
+        version, answers = None, {}
+        if mtime is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                version = data.get('version')
+                answers = data.get('answers', {})
+            except (OSError, ValueError) as e:
+                log.warning('Antwort-Speicher konnte nicht geladen werden', error=str(e))
+        with self._lock:
+            self.version, self._answers, self._mtime = version, answers, mtime
+    
+    def get(self, message, snapshot):
+        """Liefert die vorberechnete Antwort oder None."""
+        now = time.monotonic()
+        if now - self._checked >= self.interval:
+            self._checked = now
+            self.load()
+        if not self._answers:
+            return None
+        
+        version = prompt_version(snapshot)
+        with self._lock:
+            if self.version != version:
+                return None
+            entry = self._answers.get(normalize_question(message))
+            if entry is None:
+                return None
+            self.hits += 1
+            return entry['response']
+    
+    def entries(self, version):
+        """Alle Einträge, die zur angegebenen Version gehören."""
+        self.load()
+        with self._lock:
+            return dict(self._answers) if self.version == version else {}
+    
+    def save(self, version, answers):
+        """Schreibt die Datei atomar (erst temporär, dann umbenennen)."""
+        data = {
+            'version': version,
+            'updated_at': datetime.now().isoformat(),
+            'answers': answers,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._answers),
+                'version': self.version,
+                'hits': self.hits,
+            }
+
+
+answer_store = AnswerStore()
+
+
+# Einstellungen für den Prompt-Aufbau (werden in main() überschrieben)
+prompt_options = {
+    'layout': PROMPT_LAYOUT,
+    'keep_alive': OLLAMA_KEEP_ALIVE,
+}
+
+
+def keep_alive_value():
+    """keep_alive für Ollama: Ganzzahlen als Sekunden, sonst Dauer-String wie '30m'."""
+    value = str(prompt_options['keep_alive']).strip()
+    return int(value) if re.fullmatch(r'-?\d+', value) else value
+
+
+# Geschätzte Tokens, die jede Nachricht zusätzlich zu ihrem Text kostet (Rolle, Trennzeichen)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Ergebnis der Kontext-Planung: gekürzte Abschnitte und Historie, gewähltes num_ctx
+ContextPlan = namedtuple('ContextPlan', ['sections', 'history', 'num_ctx', 'tokens', 'trimmed'])
+
+
+def shorten_text(text, max_tokens):
+    """Kürzt Text auf ca. max_tokens, möglichst an einer Absatzgrenze."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    marker = '\n\n[... gekürzt]'
+    limit = (max_tokens - estimate_tokens(marker)) * 4
+    if limit <= 0:
+        return ''
+    cut = text[:limit]
+    boundary = cut.rfind('\n\n')
+    if boundary > limit // 2:
+        cut = cut[:boundary]
+    return cut.rstrip() + marker
+
+
+class ContextPlanner:
+    """Wählt num_ctx pro Request und kürzt den Prompt, falls er nicht passt.
+    
+    Der Bedarf (geschätzte Prompt-Tokens plus num_predict) wird auf die
+    nächste Stufe zwischen `minimum` und `maximum` aufgerundet; die Stufen
+    verdoppeln sich. Ollama lädt das Modell bei jedem anderen num_ctx neu,
+    deshalb gibt es nur wenige Stufen. Passt der Prompt auch in `maximum`
+    nicht, werden zuerst die ältesten Nachrichten der Historie weggelassen,
+    dann Wissensbasis-Auszug, Zusammenfassung, Live-Daten und zuletzt der
+    System-Prompt gekürzt - immer in dieser Reihenfolge, damit gleiche
+    Eingaben den gleichen Prompt ergeben. `maximum` = 0 schaltet die
+    Planung ab (Ollamas Standard-Kontext wie früher).
+    """
+    
+    # Reihenfolge, in der Abschnitte gekürzt werden (unwichtigste zuerst)
+    TRIM_ORDER = ('knowledge', 'summary', 'live', 'system')
+    
+    def __init__(self, minimum=NUM_CTX_MIN, maximum=NUM_CTX_MAX):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.last_num_ctx = None
+        self._lock = threading.Lock()
+        self._usage = Counter()
+        self._trimmed = Counter()
+    
+    @property
+    def enabled(self):
+        return self.maximum > 0
+    
+    def buckets(self):
+        """Erlaubte num_ctx-Werte (aufsteigend)."""
+        minimum = max(1, min(self.minimum, self.maximum))
+        sizes = []
+        size = minimum
+        while size < self.maximum:
+            sizes.append(size)
+            size *= 2
+        sizes.append(self.maximum)
+        return sizes
+    
+    def bucket_for(self, tokens):
+        """Kleinste Stufe, in die `tokens` passen (sonst das Maximum)."""
+        for size in self.buckets():
+            if tokens <= size:
+                return size
+        return self.maximum
+    
+    def num_ctx_for(self, tokens):
+        """num_ctx für Nebenaufrufe (Zusammenfassungen): mindestens die zuletzt
+        genutzte Stufe, damit Ollama das Modell nicht neu lädt."""
+        if not self.enabled:
+            return None
+        return max(self.bucket_for(tokens), self.last_num_ctx or 0)
+    
+    def plan(self, sections, history, num_predict):
+        """Plant einen Request.
+        
+        `sections` bildet Abschnittsnamen (siehe TRIM_ORDER) auf Text ab,
+        `history` ist die Nachrichtenliste inkl. aktueller Frage (letzter
+        Eintrag, wird nie entfernt).
+        """
+        sections = dict(sections)
+        history = list(history)
+        
+        def section_tokens(text):
+            return estimate_tokens(text) + MESSAGE_OVERHEAD_TOKENS if text else 0
+        
+        def total():
+            return (sum(section_tokens(text) for text in sections.values())
+                    + sum(section_tokens(msg['content']) for msg in history))
+        
+        tokens = total()
+        if not self.enabled:
+            return ContextPlan(sections, history, None, tokens, ())
+        
+        trimmed = []
+        # Bei sehr großem num_predict bleibt dem Prompt mindestens die Hälfte
+        budget = max(self.maximum - num_predict, self.maximum // 2)
+        # Älteste Nachrichten zuerst; die Historie soll mit einer Besucher-Nachricht beginnen
+        while tokens > budget and len(history) > 1:
+            history.pop(0)
+            while len(history) > 1 and history[0]['role'] != 'user':
+                history.pop(0)
+            tokens = total()
+            if 'history' not in trimmed:
+                trimmed.append('history')
+        
+        for name in self.TRIM_ORDER:
+            if tokens <= budget:
+                break
+            text = sections.get(name)
+            if not text:
+                continue
+            sections[name] = shorten_text(text, estimate_tokens(text) - (tokens - budget))
+            tokens = total()
+            trimmed.append(name)
+        
+        num_ctx = self.bucket_for(tokens + num_predict)
+        with self._lock:
+            self.last_num_ctx = num_ctx
+            self._usage[num_ctx] += 1
+            for name in trimmed:
+                self._trimmed[name] += 1
+        return ContextPlan(sections, history, num_ctx, tokens, tuple(trimmed))
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'buckets': self.buckets() if self.enabled else [],
+                'num_ctx_used': {str(size): count for size, count in sorted(self._usage.items())},
+                'trimmed': dict(self._trimmed),
+            }
+
+
+context_planner = ContextPlanner()
+
+
+def build_ollama_request(messages, stream=False, summary=''):
+    """Baut URL und Payload für einen /api/chat-Aufruf an Ollama.
+    
+    Im Layout 'stable' steht zuerst der statische System-Prompt (inkl.
+    Live-Daten, die sich nur mit content.json ändern), dann die Historie.
+    Alles, was sich pro Anfrage ändert (Wissensbasis-Auszug, Zusammenfassung),
+    kommt als eigene System-Nachricht direkt vor die aktuelle Frage. So bleibt
+    der Prompt-Anfang über alle Requests byte-gleich und Ollama kann seinen
+    KV-Cache wiederverwenden, statt den ganzen Prompt neu zu verarbeiten.
+    
+    Der ContextPlanner wählt num_ctx und kürzt den Prompt, falls nötig.
+    """
+    snapshot = prompt_cache.get()
+    settings = snapshot.settings
+    
+    # Relevante Abschnitte der Wissensbasis zur aktuellen Frage
+    knowledge_context = ''
+    if snapshot.knowledge_index is not None:
+        user_messages = [msg.content for msg in messages if msg.role == 'user']
+        knowledge_context = snapshot.knowledge_index.context_for(
+            ' '.join(user_messages[-2:]), knowledge_top_k, settings
+        )
+    
+    # Zusammenfassung älterer Gesprächsteile, die nicht mehr wörtlich mitgehen
+    summary_context = ''
+    if summary:
+        summary_context = '\n\n---\n\n# BISHERIGES GESPRÄCH (ZUSAMMENFASSUNG)\n\n' + sanitize_text(summary)
+    
+    history = [
+        {'role': msg.role, 'content': sanitize_text(msg.content)}
+        for msg in messages
+    ]
+    
+    # Modell aus Einstellungen
+    ollama_model = settings.get('ollamaModel', OLLAMA_MODEL)
+    max_tokens = settings.get('maxTokens', MAX_TOKENS)
+    temperature = settings.get('temperature', TEMPERATURE)
+    
+    # Kontextfenster wählen und Prompt bei Bedarf kürzen
+    plan = context_planner.plan({
+        'system': snapshot.system_prompt,
+        'live': snapshot.live_context,
+        'knowledge': knowledge_context,
+        'summary': summary_context,
+    }, history, int(max_tokens))
+    sections, history = plan.sections, plan.history
+    
+    if prompt_options['layout'] == 'stable':
+        # Statischer Anfang, Historie, variabler Kontext, aktuelle Frage
+        ollama_messages = [{'role': 'system', 'content': sections['system'] + sections['live']}]
+        ollama_messages.extend(history[:-1])
+        volatile_context = (sections['knowledge'] + sections['summary']).strip().strip('-').strip()
+        if volatile_context:
+            ollama_messages.append({'role': 'system', 'content': volatile_context})
+        ollama_messages.extend(history[-1:])
+    else:
+        # Vollständiger System-Prompt mit Wissensbasis-Auszug und Live-Daten
+        full_system_prompt = sections['system'] + sections['knowledge'] + sections['live'] + sections['summary']
+        ollama_messages = [{'role': 'system', 'content': full_system_prompt}] + history
+    
+    payload = {
+        'model': ollama_model,
+        'messages': ollama_messages,
+        'stream': stream,
+        'keep_alive': keep_alive_value(),
+        'options': {
+            'temperature': temperature,
+            'top_p': 0.9,
+            'num_predict': max_tokens,
+        }
+    }
+    if plan.num_ctx:
+        payload['options']['num_ctx'] = plan.num_ctx
+    return settings, payload
+
+
+def warm_up_model():
+    """Lädt das Modell und verarbeitet den statischen Prompt-Anfang vorab.
+    
+    Der erste echte Besucher zahlt so weder das Laden des Modells noch das
+    Prefill des System-Prompts.
+    """
+    settings, payload = build_ollama_request([ChatMessage('user', 'Hallo')])
+    payload['options']['num_predict'] = 1
+    backends.sync(backend_urls(settings))
+    for backend in backends.all():
+        started = time.monotonic()
+        try:
+            get_ollama_pool(backend.url).request('POST', '/api/chat', payload)
+            log.info('Modell vorgeladen', model=payload['model'], backend=backend.url, duration_ms=round((time.monotonic() - started) * 1000))
+        except Exception as e:
+            log.warning('Modell konnte nicht vorgeladen werden', backend=backend.url, error=str(e))
+
+
+def schedule_warm_up(previous=None, snapshot=None):
+    """Startet das Vorladen im Hintergrund (beim Start oder nach Modell-/Prompt-Wechsel)."""
+    if previous is not None and snapshot is not None:
+        old_model = previous.settings.get('ollamaModel', OLLAMA_MODEL)
+        new_model = snapshot.settings.get('ollamaModel', OLLAMA_MODEL)
+        prefix_changed = (previous.system_prompt + previous.live_context) != (snapshot.system_prompt + snapshot.live_context)
+        if old_model == new_model and not prefix_changed:
+            return
+    threading.Thread(target=warm_up_model, name='warm-up', daemon=True).start()
+
+
+class GenerationCancelled(Exception):
+    """Eine Generierung wurde abgebrochen, weil niemand mehr auf sie wartet."""
+    
+    MESSAGES = {
+        'client_disconnected': 'Verbindung zum Client getrennt',
+        'deadline': 'Zeitlimit für die Antwort überschritten',
+        'abandoned': 'Generierung abgebrochen',
+    }
+    
+    def __init__(self, reason):
+        super().__init__(self.MESSAGES.get(reason, reason))
+        self.reason = reason
+
+
+class AdmissionRejected(Exception):
+    """Ein /chat-Request wurde vom Scheduler abgewiesen (429 bzw. 503)."""
+    
+    def __init__(self, status, retry_after, message):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class TokenBucket:
+    """Token-Bucket: `rate` Tokens pro Sekunde, höchstens `burst` angespart."""
+    
+    __slots__ = ('tokens', 'updated')
+    
+    def __init__(self, burst):
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+    
+    def take(self, rate, burst):
+        """Nimmt ein Token; liefert 0 oder die Sekunden bis zum nächsten Token."""
+        now = time.monotonic()
+        self.tokens = min(float(burst), self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / rate
+
+
+class Waiter:
+    """Ein Request in der Warteschlange des Schedulers."""
+    
+    __slots__ = ('client', 'session', 'event', 'granted')
+    
+    def __init__(self, client, session):
+        self.client = client
+        self.session = session
+        self.event = threading.Event()
+        self.granted = False
+
+
+class GenerationScheduler:
+    """Begrenzt gleichzeitige Ollama-Generierungen und verteilt Wartende fair.
+    
+    Höchstens `concurrency` Generierungen laufen gleichzeitig; weitere
+    Requests warten in einer Warteschlange pro Client (IP) und darin pro
+    Session. Frei werdende Slots gehen reihum an den nächsten Client und
+    bei diesem an die nächste Session, damit ein einzelner Besucher mit
+    vielen Requests niemanden aushungert.
+    
+    Übersteigt die erwartete Wartezeit (Position / concurrency * mittlere
+    Generierungsdauer) `max_wait` oder ist die Warteschlange voll, wird
+    sofort mit 503 abgelehnt statt den Request bis zum Timeout warten zu
+    lassen. Zusätzlich begrenzt ein Token-Bucket pro Client die Anzahl
+    /chat-Requests pro Minute (429). Beide Antworten tragen Retry-After.
+    Grenzen und Zähler gelten pro Prozess.
+    """
+    
+    # Gewicht neuer Messungen im gleitenden Mittel der Generierungsdauer
+    SERVICE_SMOOTHING = 0.2
+    # Maximale Anzahl Clients, deren Token-Bucket gemerkt wird
+    MAX_CLIENTS = 10000
+    
+    def __init__(self, concurrency=GENERATION_CONCURRENCY, queue_size=GENERATION_QUEUE_SIZE,
+                 max_wait=GENERATION_MAX_WAIT, rate_per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self._lock = threading.Lock()
+        # Client -> Session -> wartende Requests, jeweils in Bedienreihenfolge
+        self._queues = OrderedDict()
+        self._buckets = OrderedDict()
+        self.active = 0
+        self.queued = 0
+        self.service_time = None
+        self.admitted = 0
+        self.rejected = 0
+        self.rate_limited = 0
+        self.waited = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+    
+    def check_rate(self, client):
+        """Zieht ein Token vom Bucket des Clients ab oder wirft AdmissionRejected (429)."""
+        if self.rate_per_minute <= 0:
+            return
+        rate = self.rate_per_minute / 60
+        burst = max(1, self.burst)
+        with self._lock:
+            bucket = self._buckets.pop(client, None) or TokenBucket(burst)
+            self._buckets[client] = bucket
+            if len(self._buckets) > self.MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+            retry_after = bucket.take(rate, burst)
+            if retry_after:
+                self.rate_limited += 1
+        if retry_after:
+            raise AdmissionRejected(429, retry_after, 'Zu viele Anfragen. Bitte warten Sie einen Moment.')
+    
+    def expected_wait(self, position):
+        """Geschätzte Wartezeit (Sekunden) für die Position in der Warteschlange."""
+        if not self.service_time or self.concurrency <= 0:
+            return 0.0
+        return position / self.concurrency * self.service_time
+    
+    def acquire(self, client, session, should_cancel=None):
+        """Wartet auf einen Generierungs-Slot; liefert die Wartezeit in Sekunden.
+        
+        Wirft AdmissionRejected (503), wenn die Warteschlange voll ist oder
+        die erwartete bzw. tatsächliche Wartezeit `max_wait` übersteigt, und
+        GenerationCancelled, wenn should_cancel() währenddessen einen Grund
+        liefert. Nach erfolgreichem acquire() muss release() folgen.
+        """
+        with self._lock:
+            if self.concurrency <= 0 or (self.active < self.concurrency and not self.queued):
+                self.active += 1
+                self.admitted += 1
+                return 0.0
+            expected = self.expected_wait(self.queued + 1)
+            if self.queued >= self.queue_size or (self.max_wait and expected > self.max_wait):
+                self.rejected += 1
+                raise AdmissionRejected(503, expected or self.max_wait, 'Der Chatbot ist gerade ausgelastet. Bitte versuchen Sie es gleich noch einmal.')
+            waiter = Waiter(client, session)
+            self._queues.setdefault(client, OrderedDict()).setdefault(session, []).append(waiter)
+            self.queued += 1
+        
+        started = time.monotonic()
+        try:
+            while not waiter.event.wait(0.5):
+                reason = should_cancel() if should_cancel is not None else None
+                if reason:
+                    raise GenerationCancelled(reason)
+                if self.max_wait and time.monotonic() - started > self.max_wait:
+                    with self._lock:
+                        self.rejected += 1
+                    raise AdmissionRejected(503, self.expected_wait(1) or self.max_wait, 'Der Chatbot ist gerade ausgelastet. Bitte versuchen Sie es gleich noch einmal.')
+        except BaseException:
+            with self._lock:
+                if waiter.granted:
+                    # Slot kam gleichzeitig mit dem Abbruch; direkt weitergeben
+                    self._hand_over()
+                else:
+                    self._remove(waiter)
+            raise
+        
+        waited = time.monotonic() - started
+        with self._lock:
+            self.admitted += 1
+            self.waited += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return waited
+    
+    def release(self, duration=None):
+        """Gibt einen Slot frei; `duration` (Sekunden) fließt in die Wartezeit-Schätzung ein."""
+        with self._lock:
+            if duration is not None:
+                if self.service_time is None:
+                    self.service_time = duration
+                else:
+                    self.service_time += self.SERVICE_SMOOTHING * (duration - self.service_time)
+            self._hand_over()
+    
+    def _hand_over(self):
+        """Gibt den Slot an den nächsten Wartenden weiter oder zählt ihn als frei (mit Lock)."""
+        if not self._queues:
+            self.active -= 1
+            return
+        # Reihum: erster Client, dessen erste Session; beide wandern danach ans Ende
+        client, client_sessions = self._queues.popitem(last=False)
+        session, waiters = client_sessions.popitem(last=False)
+        waiter = waiters.pop(0)
+        if waiters:
+            client_sessions[session] = waiters
+        if client_sessions:
+            self._queues[client] = client_sessions
+        self.queued -= 1
+        waiter.granted = True
+        waiter.event.set()
+    
+    def _remove(self, waiter):
+        """Entfernt einen Wartenden, der aufgegeben hat (mit Lock)."""
+        client_sessions = self._queues.get(waiter.client)
+        waiters = client_sessions.get(waiter.session) if client_sessions else None
+        if not waiters or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        self.queued -= 1
+        if not waiters:
+            del client_sessions[waiter.session]
+        if not client_sessions:
+            del self._queues[waiter.client]
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'active': self.active,
+                'concurrency': self.concurrency,
+                'queued': self.queued,
+                'queue_size': self.queue_size,
+                'queued_clients': len(self._queues),
+                'expected_wait_ms': round(self.expected_wait(self.queued + 1) * 1000, 1),
+                'avg_wait_ms': round(self.wait_total / self.waited * 1000, 1) if self.waited else 0.0,
+                'max_wait_ms': round(self.wait_max * 1000, 1),
+                'avg_generation_ms': round(self.service_time * 1000, 1) if self.service_time else None,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'rate_limited': self.rate_limited,
+                'rate_limit_per_minute': self.rate_per_minute,
+            }
+
+
+scheduler = GenerationScheduler()
+
+
+class Flight:
+    """Eine laufende Generierung, deren Text-Fragmente mehrere Requests lesen."""
+    
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.followers = 0
+        self.cond = threading.Condition()
+    
+    def publish(self, token):
+        with self.cond:
+            self.chunks.append(token)
+            self.cond.notify_all()
+    
+    def finish(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+    
+    def subscribe(self):
+        """Liefert alle bisherigen und kommenden Fragmente bis zum Ende."""
+        position = 0
+        while True:
+            with self.cond:
+                while position >= len(self.chunks) and not self.done:
+                    self.cond.wait()
+                chunks = self.chunks[position:]
+                position = len(self.chunks)
+                done, error = self.done, self.error
+            for token in chunks:
+                yield token
+            if done and position >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+def primed(generator):
+    """Führt einen Generator bis zu seinem ersten, leeren yield aus.
+    
+    Die so vorbereiteten Generatoren beginnen mit `yield` innerhalb ihres
+    try-Blocks; close() räumt dann auch auf, wenn noch kein Wert gelesen
+    wurde (ein nie gestarteter Generator ignoriert close()).
+    """
+    next(generator)
+    return generator
+
+
+class SingleFlight:
+    """Fasst gleichzeitige, identische Generierungen zusammen.
+    
+    Der erste Request mit einem bestimmten Schlüssel (Leader) ruft Ollama
+    auf; alle weiteren, die währenddessen mit demselben Schlüssel kommen,
+    lesen dessen Ergebnis bzw. Stream mit, statt selbst zu generieren.
+    """
+    
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+    
+    def run(self, key, produce, admit=None):
+        """Liefert die Fragmente von produce() - selbst erzeugt oder mitgelesen.
+        
+        Nur der Leader ruft vorher admit() auf (z.B. um auf einen Slot im
+        Scheduler zu warten); Mitleser erzeugen keine Last bei Ollama und
+        warten einfach mit. Scheitert admit(), bekommen die Mitleser
+        denselben Fehler.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = Flight()
+                self._flights[key] = flight
+                self.leaders += 1
+                leader = True
+            else:
+                flight.followers += 1
+                self.coalesced += 1
+                leader = False
+        
+        if leader:
+            if admit is not None:
+                try:
+                    admit()
+                except BaseException as e:
+                    self._finish(key, flight, e)
+                    raise
+            return primed(self._lead(key, flight, produce))
+        return primed(self._follow(flight))
+    
+    def _follow(self, flight):
+        try:
+            yield
+            yield from flight.subscribe()
+        finally:
+            # Auch bei vorzeitigem Abbruch: dieser Mitleser wartet nicht mehr
+            with self._lock:
+                flight.followers -= 1
+    
+    def _lead(self, key, flight, produce):
+        tokens = produce()
+        try:
+            yield
+            for token in tokens:
+                flight.publish(token)
+                yield token
+        except GeneratorExit:
+            # Der Leader-Client ist weg; für Mitleser trotzdem zu Ende generieren
+            with self._lock:
+                self._flights.pop(key, None)
+                followers = flight.followers
+            if followers:
+                self._drain(flight, tokens)
+            else:
+                # Schließt die Verbindung zu Ollama, das die Generierung dann abbricht
+                tokens.close()
+                flight.finish(GenerationCancelled('abandoned'))
+            raise
+        except Exception as e:
+            self._finish(key, flight, e)
+            raise
+        self._finish(key, flight)
+    
+    def _drain(self, flight, tokens):
+        """Generiert für die Mitleser zu Ende, solange noch einer liest."""
+        try:
+            for token in tokens:
+                flight.publish(token)
+                with self._lock:
+                    abandoned = flight.followers <= 0
+                if abandoned:
+                    tokens.close()
+                    metrics.cancelled('abandoned')
+                    flight.finish(GenerationCancelled('abandoned'))
+                    return
+            flight.finish()
+        except Exception as e:
+            flight.finish(e)
+    
+    def _finish(self, key, flight, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(error)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+            }
+
+
+inflight = SingleFlight()
+
+
+def flight_key(payload):
+    """Schlüssel einer Generierung: Payload ohne Stream-Flag."""
+    effective = {k: v for k, v in payload.items() if k != 'stream'}
+    raw = json.dumps(effective, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def call_ollama(messages, session_id=None, summary='', should_cancel=None, on_first_token=None, admit=None):
+    """Ruft Ollama API auf und gibt die Antwort zurück.
+    
+    Intern wird gestreamt, damit die Generierung abgebrochen werden kann,
+    sobald should_cancel() einen Grund liefert (siehe call_ollama_stream).
+    on_first_token() wird beim ersten Text-Fragment aufgerufen, z.B. um
+    die Zeit bis zum ersten Token zu messen.
+    """
+    tokens = call_ollama_stream(messages, session_id, summary, should_cancel, admit)
+    parts = []
+    try:
+        for token in tokens:
+            if not parts and on_first_token is not None:
+                on_first_token()
+            parts.append(token)
+    finally:
+        tokens.close()
+    response_text = ''.join(parts)
+    return response_text or 'Entschuldigung, ich konnte keine Antwort generieren.'
+
+
+def call_ollama_stream(messages, session_id=None, summary='', should_cancel=None, admit=None):
+    """Ruft Ollama im Streaming-Modus auf und liefert die Antwort stückweise.
+    
+    Ollama sendet NDJSON (ein JSON-Objekt pro Zeile). Der zurückgegebene
+    Generator liefert die Text-Fragmente in der Reihenfolge, in der sie
+    ankommen. Zwischen den Fragmenten wird should_cancel() gefragt; liefert
+    es einen Grund (z.B. 'client_disconnected', 'deadline'), endet der
+    Generator mit GenerationCancelled. Wird er geschlossen, bricht Ollama
+    die Generierung ab - außer andere Requests lesen sie per Coalescing
+    noch mit.
+    
+    admit() wird noch vor der Rückgabe aufgerufen, aber nur, wenn dieser
+    Request die Generierung selbst startet (siehe SingleFlight.run); seine
+    Fehler (z.B. AdmissionRejected) kommen direkt beim Aufruf.
+    """
+    started = time.monotonic()
+    settings, payload = build_ollama_request(messages, stream=True, summary=summary)
+    metrics.observe('prompt', time.monotonic() - started)
+    
+    def produce():
+        for chunk in ollama_stream(settings, '/api/chat', payload, session_id):
+            if chunk.get('error'):
+                raise Exception(chunk['error'])
+            if chunk.get('done'):
+                metrics.observe_generation(chunk)
+            token = chunk.get('message', {}).get('content', '')
+            if token:
+                yield token
+    
+    tokens = inflight.run(flight_key(payload), produce, admit)
+    return primed(relay_tokens(tokens, settings, should_cancel))
+
+
+def relay_tokens(tokens, settings, should_cancel=None):
+    """Reicht die Fragmente einer Generierung weiter (Abbruch und Fehlerbehandlung)."""
+    try:
+        yield
+        for token in tokens:
+            reason = should_cancel() if should_cancel is not None else None
+            if reason:
+                raise GenerationCancelled(reason)
+            yield token
+    
+    except GenerationCancelled as e:
+        log.info('Generierung abgebrochen', reason=e.reason)
+        metrics.cancelled(e.reason)
+        raise
+    except AdmissionRejected:
+        # Der Leader wurde vom Scheduler abgewiesen
+        raise
+    except (OSError, http.client.HTTPException) as e:
+        log.error('Ollama Verbindungsfehler', error=str(e))
+        metrics.error('ollama_unreachable')
+        raise Exception(f"Ollama nicht erreichbar. Ist Ollama gestartet? ({', '.join(backend_urls(settings))})")
+    except Exception as e:
+        log.error('Ollama Fehler', error=str(e))
+        metrics.error('ollama')
+        raise
+    finally:
+        tokens.close()
+
+
+# Einstellungen für /chat-Requests (werden in main() überschrieben)
+request_options = {
+    'deadline': CHATBOT_REQUEST_DEADLINE,
+}
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer, der Requests in einem begrenzten Thread-Pool abarbeitet.
+    
+    Ein langsamer /chat-Request blockiert so nicht mehr /health oder andere
+    Besucher. Die Anzahl Threads begrenzt gleichzeitig die Last auf Ollama.
+    
+    Sind alle Threads belegt, sieht sich ein kleiner Triage-Pool die
+    Request-Zeile neuer Verbindungen an: GET /health und /metrics beantwortet
+    er selbst, alles andere wartet auf einen Worker-Thread, solange höchstens
+    `backlog` Verbindungen warten, und wird sonst sofort mit 503 abgelehnt.
+    """
+    
+    # Pfade, die nie hinter /chat-Requests warten
+    CONTROL_PATHS = (b'/health', b'/metrics')
+    # Threads für Triage, Health-Checks und Metriken
+    CONTROL_THREADS = 2
+    # Sekunden, die die Triage auf die Request-Zeile wartet
+    TRIAGE_TIMEOUT = 1.0
+    
+    def __init__(self, server_address, handler_class, max_workers=CHATBOT_THREADS, backlog=CHATBOT_BACKLOG):
+        super().__init__(server_address, handler_class)
+        self.max_workers = max_workers
+        self.backlog = backlog
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='chatbot')
+        self.control = ThreadPoolExecutor(max_workers=self.CONTROL_THREADS, thread_name_prefix='chatbot-control')
+        self.control_thread = threading.local()
+        # Verbindungen im Worker-Pool (laufend und wartend)
+        self.connections = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+    
+    def get_request(self):
+        request, client_address = super().get_request()
+        # Im Prefork-Betrieb ist der Listening-Socket nicht-blockierend
+        request.setblocking(True)
+        return request, client_address
+    
+    def _admit(self, limit):
+        """Reserviert einen Platz im Worker-Pool, solange weniger als `limit` belegt sind."""
+        with self._lock:
+            if self.connections >= limit:
+                return False
+            self.connections += 1
+            return True
+    
+    def process_request(self, request, client_address):
+        """Übergibt die Verbindung an einen freien Worker-Thread, sonst an die Triage."""
+        if self._admit(self.max_workers):
+            self.executor.submit(self.process_request_thread, request, client_address)
+        else:
+            self.control.submit(self.triage, request, client_address)
+    
+    def process_request_thread(self, request, client_address):
+        """Bearbeitet eine Verbindung im Worker-Thread."""
+        try:
+            self.serve_connection(request, client_address)
+        finally:
+            with self._lock:
+                self.connections -= 1
+    
+    def serve_connection(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+    
+    def triage(self, request, client_address):
+        """Verteilt eine Verbindung, während alle Worker-Threads belegt sind."""
+        self.control_thread.active = True
+        if self.request_path(request) in self.CONTROL_PATHS:
+            self.serve_connection(request, client_address)
+        elif self._admit(self.max_workers + self.backlog):
+            self.executor.submit(self.process_request_thread, request, client_address)
+        else:
+            self.reject(request)
+    
+    def in_control_thread(self):
+        return getattr(self.control_thread, 'active', False)
+    
+    def request_path(self, request):
+        """Liest den Pfad eines GET-Requests, ohne ihn aus dem Socket zu entfernen."""
+        try:
+            ready, _, _ = select.select([request], [], [], self.TRIAGE_TIMEOUT)
+            head = request.recv(256, socket.MSG_PEEK) if ready else b''
+        except OSError:
+            return None
+        parts = head.split(b' ', 2)
+        if len(parts) < 3 or parts[0] != b'GET':
+            return None
+        return parts[1].split(b'?', 1)[0]
+    
+    def reject(self, request):
+        """Lehnt eine Verbindung mit 503 ab, ohne einen Worker-Thread zu belegen."""
+        self.rejected += 1
+        metrics.error('overloaded')
+        retry_after = max(1, math.ceil(scheduler.expected_wait(self.backlog)))
+        body = json.dumps({
+            'error': 'Der Chatbot ist gerade ausgelastet. Bitte versuchen Sie es gleich noch einmal.',
+            'retry_after': retry_after,
+        }, ensure_ascii=False).encode('utf-8')
+        head = (
+            'HTTP/1.1 503 Service Unavailable\r\n'
+            'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Retry-After: {retry_after}\r\n'
+            'Access-Control-Allow-Origin: *\r\n'
+            'Access-Control-Expose-Headers: Retry-After\r\n'
+            'Connection: close\r\n\r\n'
+        ).encode('ascii')
+        try:
+            request.settimeout(self.TRIAGE_TIMEOUT)
+            request.sendall(head + body)
+            # Bereits angekommene Request-Daten lesen, sonst verwirft ein
+            # RST beim Schließen die Antwort beim Client
+            request.settimeout(0)
+            for _ in range(MAX_BODY_SIZE // 65536 + 1):
+                if not request.recv(65536):
+                    break
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'threads': self.max_workers,
+                'connections': self.connections,
+                'waiting': max(0, self.connections - self.max_workers),
+                'backlog': self.backlog,
+                'rejected': self.rejected,
+            }
+    
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+        self.control.shutdown(wait=False)
+
+
+class ChatbotHandler(BaseHTTPRequestHandler):
+    """HTTP Request Handler für den Chatbot.
+    
+    Spricht HTTP/1.1: Verbindungen bleiben offen, solange jede Antwort eine
+    Content-Length hat. Ausnahmen sind SSE-Streams und Fehler, bei denen der
+    Request-Body nicht gelesen wurde; dort wird die Verbindung geschlossen.
+    Wartet eine offene Verbindung länger als `timeout` Sekunden auf den
+    nächsten Request, wird sie geschlossen und gibt ihren Worker-Thread frei.
+    
+    Jeder Request bekommt eine ID (X-Request-ID, vom Client übernommen oder
+    neu erzeugt), die in allen Log-Einträgen und in der Antwort steht. Am
+    Ende wird eine Zugriffszeile mit Status und Dauer geloggt.
+    """
+    
+    protocol_version = 'HTTP/1.1'
+    timeout = CHATBOT_KEEPALIVE_TIMEOUT
+    
+    def handle_one_request(self):
+        self.request_id = None
+        self.response_status = None
+        self.log_fields = {}
+        try:
+            super().handle_one_request()
+        finally:
+            if self.request_id is not None:
+                log.info(
+                    'request',
+                    method=self.command,
+                    path=urlparse(self.path).path if self.path else None,
+                    status=self.response_status,
+                    duration_ms=round((time.monotonic() - self.request_started) * 1000, 1),
+                    client=self.client_address[0],
+                    **self.log_fields
+                )
+                log_context.request_id = None
+                log_context.session = None
+                log_context.sampled = True
+    
+    def parse_request(self):
+        """Liest Request-Zeile und Header und legt den Log-Kontext an."""
+        ok = super().parse_request()
+        self.request_started = time.monotonic()
+        client_id = self.headers.get('X-Request-ID', '') if ok else ''
+        if not re.fullmatch(r'[\w.-]{1,64}', client_id):
+            client_id = uuid.uuid4().hex[:12]
+        self.request_id = client_id
+        log_context.request_id = client_id
+        log_context.session = None
+        log_context.sampled = log.sampled()
+        return ok
+    
+    def log_request(self, code='-', size='-'):
+        # Geloggt wird erst am Ende des Requests, mit Dauer (handle_one_request)
+        self.response_status = int(code) if isinstance(code, int) else code
+    
+    def log_message(self, format, *args):
+        """Leitet Meldungen von BaseHTTPRequestHandler an den Logger weiter."""
+        log.info(format % args)
+    
+    def log_error(self, format, *args):
+        # Abgelaufene Keep-Alive-Verbindungen sind der Normalfall, kein Fehler
+        if format.startswith('Request timed out'):
+            return
+        log.warning(format % args)
+    
+    def end_headers(self):
+        if self.request_id:
+            self.send_header('X-Request-ID', self.request_id)
+        super().end_headers()
+    
+    def send_cors_headers(self):
+        """Sendet CORS-Header für Cross-Origin-Requests."""
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Session-ID, X-Request-ID')
+        self.send_header('Access-Control-Expose-Headers', 'X-Request-ID, Retry-After')
+        self.send_header('Access-Control-Max-Age', str(CORS_MAX_AGE))
+    
+    def accepts_gzip(self):
+        """Prüft, ob der Client gzip akzeptiert (ohne q=0)."""
+        for coding in self.headers.get('Accept-Encoding', '').split(','):
+            name, _, params = coding.strip().partition(';')
+            if name.strip().lower() in ('gzip', '*'):
+                return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+        return False
+    
+    def send_body(self, body, content_type, status=200, compress=True, headers=None):
+        """Sendet eine vollständige Antwort mit Content-Length (ggf. gzip)."""
+        encoded = False
+        if compress and len(body) >= GZIP_MIN_SIZE and self.accepts_gzip():
+            body = gzip.compress(body, compresslevel=5)
+            encoded = True
+        
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if compress:
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoded:
+            self.send_header('Content-Encoding', 'gzip')
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def send_json_response(self, data, status=200, headers=None):
+        """Sendet JSON-Response."""
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_body(body, 'application/json; charset=utf-8', status, headers=headers)
+    
+    def read_body(self, max_size=MAX_BODY_SIZE):
+        """Liest den Request-Body vollständig.
+        
+        Ist die Länge ungültig, zu groß oder unbekannt (chunked), wird
+        direkt mit einem Fehler geantwortet und die Verbindung danach
+        geschlossen - der ungelesene Body würde sonst als nächster Request
+        gelesen. Liefert dann None.
+        """
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            self.close_connection = True
+            metrics.error('length_required')
+            self.send_json_response({'error': 'Content-Length erforderlich'}, status=411)
+            return None
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            metrics.error('invalid_length')
+            self.send_json_response({'error': 'Ungültige Content-Length'}, status=400)
+            return None
+        if length > max_size:
+            self.close_connection = True
+            metrics.error('request_too_large')
+            self.send_json_response({'error': 'Request too large'}, status=413)
+            return None
+        return self.rfile.read(length)
+    
+    def client_ip(self):
+        """IP des Besuchers; hinter einem lokalen Proxy (server.js) aus X-Forwarded-For."""
+        peer = self.client_address[0]
+        forwarded = self.headers.get('X-Forwarded-For', '')
+        try:
+            trusted = ipaddress.ip_address(peer).is_loopback
+        except ValueError:
+            trusted = False
+        if forwarded and trusted:
+            return forwarded.split(',')[0].strip() or peer
+        return peer
+    
+    def client_disconnected(self):
+        """Prüft ohne zu blockieren, ob der Client die Verbindung geschlossen hat."""
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            # Lesbar, aber keine Daten: Gegenseite hat geschlossen
+            return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+        except (OSError, ValueError):
+            return True
+    
+    def cancel_check(self, started, deadline):
+        """Liefert eine should_cancel-Funktion für call_ollama(_stream)."""
+        def should_cancel():
+            if deadline and time.monotonic() - started > deadline:
+                return 'deadline'
+            if self.client_disconnected():
+                return 'client_disconnected'
+            return None
+        return should_cancel
+    
+    def first_token(self, started):
+        """Misst die Zeit vom Request-Beginn bis zum ersten Token."""
+        first_token = time.monotonic() - started
+        metrics.observe('first_token', first_token)
+        self.log_fields['first_token_ms'] = round(first_token * 1000, 1)
+    
+    def send_sse_event(self, data, event=None):
+        """Schreibt ein Server-Sent Event und leert den Puffer sofort."""
+        payload = ''
+        if event:
+            payload += f'event: {event}\n'
+        payload += f'data: {json.dumps(data, ensure_ascii=False)}\n\n'
+        self.wfile.write(payload.encode('utf-8'))
+        self.wfile.flush()
+    
+    def stream_chat_response(self, tokens, session_id, cached=None, started=None):
+        """Streamt die Ollama-Antwort als Server-Sent Events an den Client.
+        
+        `tokens` ist die bereits gestartete Generierung (call_ollama_stream);
+        eine gecachte Antwort (`cached`) wird stattdessen als einzelnes
+        Token gesendet. Events: `start` (Session-ID), `token`
+        (Text-Fragment), `done` (vollständige Antwort) oder `error`. Gibt
+        den vollständigen Text zurück, oder None, wenn die Generierung
+        fehlgeschlagen ist. `started` (time.monotonic() bei Request-Beginn)
+        dient der Messung der Zeit bis zum ersten Token.
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('X-Accel-Buffering', 'no')
+        # Ohne Content-Length endet der Stream mit dem Schließen der Verbindung
+        self.send_header('Connection', 'close')
+        self.send_cors_headers()
+        self.end_headers()
+        self.close_connection = True
+        
+        self.send_sse_event({'session_id': session_id}, event='start')
+        parts = []
+        try:
+            if cached is not None:
+                tokens = iter([cached])
+            for token in tokens:
+                if not parts and started is not None:
+                    self.first_token(started)
+                parts.append(token)
+                self.send_sse_event({'token': token}, event='token')
+        except (BrokenPipeError, ConnectionResetError, GenerationCancelled) as e:
+            if isinstance(e, GenerationCancelled) and e.reason == 'deadline':
+                try:
+                    self.send_sse_event({'error': str(e)}, event='error')
+                except OSError:
+                    pass
+            else:
+                log.info('Client hat Stream abgebrochen')
+                if cached is None and not isinstance(e, GenerationCancelled):
+                    metrics.cancelled('client_disconnected')
+            return None
+        except Exception as e:
+            log.error('Chat-Fehler', error=str(e))
+            metrics.error('chat')
+            self.send_sse_event({
+                'error': str(e),
+                'hint': 'Überprüfe die Ollama-Konfiguration in den Admin-Einstellungen'
+            }, event='error')
+            return None
+        finally:
+            # Bricht die Generierung ab, falls sie noch läuft
+            if cached is None and tokens is not None:
+                tokens.close()
+        
+        response_text = ''.join(parts) or 'Entschuldigung, ich konnte keine Antwort generieren.'
+        self.send_sse_event({'response': response_text, 'session_id': session_id}, event='done')
+        return response_text
+    
+    def do_OPTIONS(self):
+        """Behandelt CORS Preflight-Requests."""
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.send_cors_headers()
+        self.end_headers()
+    
+    def do_GET(self):
+        """Behandelt GET-Requests."""
+        parsed = urlparse(self.path)
+        if self.server.in_control_thread():
+            # Triage-Threads nicht mit Keep-Alive-Verbindungen belegen
+            self.close_connection = True
+        
+        if parsed.path == '/health':
+            # Health-Check Endpoint
+            self.send_json_response({
+                'status': 'ok',
+                'service': 'chatbot',
+                'timestamp': datetime.now().isoformat(),
+                'sessions_active': len(sessions),
+                'session_store': sessions.stats(),
+                'response_cache': response_cache.stats(),
+                'answer_store': answer_store.stats(),
+                'context_planner': context_planner.stats(),
+                'logging': log.stats(),
+                'coalescing': inflight.stats(),
+                'scheduler': scheduler.stats(),
+                'ollama_backends': backends.stats(),
+                'worker_threads': self.server.max_workers,
+                'connections': self.server.stats(),
+                'worker_pid': os.getpid()
+            })
+        
+        elif parsed.path == '/config':
+            # Gibt aktuelle Konfiguration zurück (ohne sensible Daten)
+            settings = prompt_cache.get().settings
+            self.send_json_response({
+                'enabled': settings.get('enabled', True),
+                'model': settings.get('ollamaModel', OLLAMA_MODEL),
+                'ollama_url': settings.get('ollamaUrl', OLLAMA_URL),
+                'ollama_urls': backend_urls(settings),
+                'max_tokens': settings.get('maxTokens', MAX_TOKENS),
+                'temperature': settings.get('temperature', TEMPERATURE),
+            })
+        
+        elif parsed.path == '/metrics':
+            # Prometheus-Metriken (Latenzen je Phase, Tokens/s, Fehler)
+            self.send_body(metrics.render().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8')
+        
+        elif parsed.path == '/test-ollama':
+            # Testet Ollama-Verbindung
+            settings = prompt_cache.get().settings
+            ollama_url = settings.get('ollamaUrl', OLLAMA_URL)
+            try:
+                data = ollama_request(settings, 'GET', '/api/tags', timeout=5)
+                models = [m.get('name', 'unknown') for m in data.get('models', [])]
+                self.send_json_response({
+                    'success': True,
+                    'message': 'Ollama ist erreichbar',
+                    'available_models': models,
+                    'configured_model': settings.get('ollamaModel', OLLAMA_MODEL),
+                    'backends': backends.stats()['backends']
+                })
+            except Exception as e:
+                self.send_json_response({
+                    'success': False,
+                    'error': f'Ollama nicht erreichbar: {str(e)}',
+                    'ollama_url': ollama_url,
+                    'backends': backends.stats()['backends'],
+                    'hint': 'Stelle sicher, dass Ollama gestartet ist (ollama serve)'
+                }, status=503)
+        
+        else:
+            self.send_json_response({'error': 'Not found'}, status=404)
+    
+    def handle_chat(self, started):
+        """Beantwortet eine Chat-Nachricht (POST /chat)."""
+        try:
+            # Body lesen
+            body = self.read_body()
+            if body is None:
+                return
+            data = json.loads(body.decode('utf-8'))
+            metrics.observe('parse', time.monotonic() - started)
+            
+            message = data.get('message', '').strip()
+            if not message:
+                metrics.error('empty_message')
+                self.send_json_response({'error': 'Keine Nachricht angegeben'}, status=400)
+                return
+            
+            # Token-Bucket pro Client, bevor Session oder Prompt angefasst werden
+            client = self.client_ip()
+            scheduler.check_rate(client)
+            
+            # Streaming per Body-Flag oder Accept-Header
+            wants_stream = bool(data.get('stream')) or 'text/event-stream' in self.headers.get('Accept', '')
+            
+            # Session-ID aus Header oder Body
+            session_id = self.headers.get('X-Session-ID') or data.get('session_id')
+            
+            # Neue Session erstellen oder bestehende verwenden
+            with sessions.lock:
+                session = sessions.get(session_id)
+                if session is None:
+                    session = sessions.create()
+                    log_context.session = session.session_id[:8]
+                    log.info('Neue Session erstellt')
+                session_id = session.session_id
+                log_context.session = session_id[:8]
+                
+                sessions.touch(session)
+                
+                # Die Frage kommt erst zusammen mit der Antwort in die Session,
+                # abgelehnte oder abgebrochene Requests hinterlassen so nichts.
+                # Nur die neuesten Nachrichten im Token-Budget gehen wörtlich mit.
+                _, history = trim_history(
+                    session.messages + [ChatMessage('user', message)], history_options['token_budget']
+                )
+                summary = session.summary
+                # Erstfrage nach der ganzen Session, nicht nach der gekürzten Historie
+                first_turn = not session.messages and not summary
+            
+            # Erstfragen zuerst im Antwort-Cache nachschlagen
+            cache_key, cached = None, None
+            if first_turn:
+                snapshot = prompt_cache.get()
+                cache_key = response_cache_key(message, snapshot)
+                cached = response_cache.get(cache_key, snapshot.fingerprint)
+                if cached is None:
+                    # Offline vorberechnete Antwort (--batch)
+                    cached = answer_store.get(message, snapshot)
+            
+            # Ollama aufrufen mit Historie und Zusammenfassung
+            # (ohne Lock, damit andere Sessions parallel laufen können);
+            # abgebrochen wird, wenn der Client weg ist oder das Zeitlimit abläuft
+            should_cancel = self.cancel_check(started, request_options['deadline'])
+            self.log_fields.update(stream=wants_stream, cached=cached is not None, history=len(history))
+            
+            # Wer eine Generierung startet, braucht einen Slot im Scheduler;
+            # wer per Coalescing nur mitliest, nicht (siehe SingleFlight.run)
+            slot = []
+            
+            def admit():
+                waited = scheduler.acquire(client, session_id, should_cancel)
+                slot.append(time.monotonic())
+                metrics.observe('admission', waited)
+                self.log_fields['admission_ms'] = round(waited * 1000, 1)
+            
+            response_text = None
+            tokens = None
+            try:
+                if wants_stream:
+                    # Generierung vor den SSE-Headern starten, damit eine
+                    # Ablehnung noch als 503 beantwortet werden kann
+                    if cached is None:
+                        tokens = call_ollama_stream(history, session_id, summary, should_cancel, admit)
+                    response_text = self.stream_chat_response(tokens, session_id, cached, started)
+                elif cached is not None:
+                    response_text = cached
+                else:
+                    response_text = call_ollama(
+                        history, session_id, summary, should_cancel,
+                        on_first_token=lambda: self.first_token(started), admit=admit
+                    )
+            finally:
+                if tokens is not None:
+                    tokens.close()
+                if slot:
+                    # Nur vollständige Generierungen fließen in die Wartezeit-Schätzung ein
+                    duration = time.monotonic() - slot[0] if response_text is not None else None
+                    scheduler.release(duration)
+            if response_text is None:
+                return
+            
+            if cache_key and cached is None:
+                response_cache.put(cache_key, snapshot.fingerprint, response_text)
+            
+            # Frage und Antwort zur Historie hinzufügen; ältere Nachrichten
+            # werden im Hintergrund zusammengefasst
+            with sessions.lock:
+                sessions.append(session, 'user', message)
+                sessions.append(session, 'assistant', response_text)
+                older, _ = trim_history(session.messages, history_options['token_budget'])
+                schedule_summary(session, len(older))
+            
+            if wants_stream:
+                return
+            
+            self.send_json_response({
+                'response': response_text,
+                'session_id': session_id
+            })
+            
+        except json.JSONDecodeError:
+            metrics.error('invalid_json')
+            self.send_json_response({'error': 'Ungültiges JSON'}, status=400)
+        except AdmissionRejected as e:
+            metrics.error('rate_limited' if e.status == 429 else 'overloaded')
+            self.send_json_response(
+                {'error': str(e), 'retry_after': e.retry_after},
+                status=e.status,
+                headers={'Retry-After': str(e.retry_after)}
+            )
+        except GenerationCancelled as e:
+            if e.reason == 'client_disconnected':
+                self.close_connection = True
+            else:
+                self.send_json_response({'error': str(e)}, status=504)
+        except Exception as e:
+            log.error('Chat-Fehler', error=str(e))
+            metrics.error('chat')
+            self.send_json_response({
+                'error': str(e),
+                'hint': 'Überprüfe die Ollama-Konfiguration in den Admin-Einstellungen'
+            }, status=500)
+    
+    def do_POST(self):
+        """Behandelt POST-Requests."""
+        parsed = urlparse(self.path)
+        
+        if parsed.path == '/chat':
+            started = time.monotonic()
+            metrics.request_started()
+            try:
+                self.handle_chat(started)
+            finally:
+                metrics.request_finished()
+                metrics.observe('total', time.monotonic() - started)
+        
+        elif parsed.path == '/clear-session':
+            # Session löschen
+            try:
+                body = self.read_body()
+                if body is None:
+                    return
+                data = json.loads(body.decode('utf-8')) if body else {}
+                
+                session_id = self.headers.get('X-Session-ID') or data.get('session_id')
+                
+                if session_id and sessions.delete(session_id):
+                    log_context.session = session_id[:8]
+                    log.info('Session gelöscht')
+                    self.send_json_response({'success': True, 'message': 'Session gelöscht'})
+                else:
+                    self.send_json_response({'success': True, 'message': 'Session nicht gefunden'})
+                    
+            except Exception as e:
+                self.send_json_response({'error': str(e)}, status=500)
+        
+        else:
+            # Body wurde nicht gelesen
+            self.close_connection = True
+            self.send_json_response({'error': 'Not found'}, status=404)
+
+
+def apply_config(config):
+    """Überträgt die geladene Konfiguration auf die globalen Komponenten."""
+    global knowledge_top_k
+    
+    ollama_pool_options.update({
+        'size': config['ollama_pool_size'],
+        'connect_timeout': config['ollama_connect_timeout'],
+        'read_timeout': config['ollama_read_timeout'],
+        'retries': config['ollama_retries'],
+    })
+    history_options.update({
+        'token_budget': config['history_token_budget'],
+        'summary_max_tokens': config['summary_max_tokens'],
+    })
+    knowledge_top_k = config['knowledge_top_k']
+    prompt_options.update({
+        'layout': config['prompt_layout'],
+        'keep_alive': config['keep_alive'],
+    })
+    context_planner.minimum = config['num_ctx_min']
+    context_planner.maximum = config['num_ctx_max']
+    ChatbotHandler.timeout = config['keepalive_timeout'] or None
+    log.configure(config['log_level'], config['log_format'], config['log_file'],
+                  config['log_sample_rate'], config['log_buffer'])
+    request_options['deadline'] = config['request_deadline']
+    scheduler.concurrency = config['generation_concurrency']
+    scheduler.queue_size = config['generation_queue_size']
+    if config['generation_concurrency'] > 0:
+        # Im Scheduler warten können nur Requests, die schon einen Worker-Thread
+        # haben; alles darüber hinaus wartet im Verbindungs-Backlog
+        waiting = max(0, config['threads'] - config['generation_concurrency'])
+        if config['generation_queue_size'] > waiting:
+            log.warning('generation_queue_size größer als threads - generation_concurrency, wird begrenzt',
+                        generation_queue_size=config['generation_queue_size'], threads=config['threads'],
+                        generation_concurrency=config['generation_concurrency'], effective=waiting)
+            scheduler.queue_size = waiting
+    scheduler.max_wait = config['generation_max_wait']
+    scheduler.rate_per_minute = config['rate_limit_per_minute']
+    scheduler.burst = config['rate_limit_burst']
+    backend_options['urls'] = list(config['ollama_urls'])
+    backends.max_failures = config['ollama_max_failures']
+    answer_store.path = Path(config['answer_store'])
+    answer_store.interval = config['prompt_watch_interval']
+    response_cache.max_entries = config['response_cache_size']
+    response_cache.ttl = config['response_cache_ttl']
+    prompt_cache.interval = config['prompt_watch_interval']
+    prompt_cache.knowledge_mode = config['knowledge_mode']
+    prompt_cache.knowledge_pinned = config['knowledge_pinned']
+    prompt_cache.knowledge_fallback = config['knowledge_fallback']
+    prompt_cache.embedding_model = config['embedding_model']
+
+
+def start_services(config):
+    """Startet Session-Speicher und Hintergrund-Threads (pro Prozess)."""
+    global sessions
+    
+    sessions = create_session_store(config)
+    sessions.start_sweeper(config['session_sweep_interval'])
+    answer_store.load()
+    # Prompt-Snapshot bauen und Dateien im Hintergrund überwachen
+    prompt_cache.start_watcher()
+    backends.sync(backend_urls(prompt_cache.get().settings))
+    backends.start_health_checks(config['ollama_health_interval'])
+    if config['warmup']:
+        prompt_cache.add_listener(schedule_warm_up)
+        schedule_warm_up()
+
+
+class PreforkSupervisor:
+    """Startet N Worker-Prozesse auf einem gemeinsamen Listening-Socket.
+    
+    Der Elternprozess bindet den Socket, forkt die Worker und überwacht sie:
+    abgestürzte Worker werden neu gestartet, SIGHUP ersetzt alle Worker
+    nacheinander (Graceful Reload, z.B. nach Änderungen an config.json),
+    SIGTERM/SIGINT beendet alle. Worker beenden sich bei SIGTERM erst, wenn
+    ihre laufenden Requests fertig sind.
+    """
+    
+    def __init__(self, server, workers):
+        self.server = server
+        self.workers = workers
+        self.children = {}
+        # Beim Reload ersetzte Worker, die nicht neu gestartet werden
+        self.retiring = set()
+        self.stopping = False
+        self.reload_requested = False
+    
+    def run(self):
+        # Nicht-blockierend, damit ein Worker nicht in accept() hängt, wenn ein
+        # anderer die Verbindung bereits angenommen hat
+        self.server.socket.setblocking(False)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGHUP, self._request_reload)
+        
+        for _ in range(self.workers):
+            self._spawn()
+        
+        while not self.stopping:
+            if self.reload_requested:
+                self.reload_requested = False
+                self._reload()
+            self._reap(respawn=True)
+            time.sleep(0.2)
+        
+        print("\n🛑 Beende Worker-Prozesse...")
+        for pid in list(self.children):
+            self._terminate(pid)
+        while self.children:
+            self._reap(respawn=False)
+            time.sleep(0.1)
+        self.server.server_close()
+    
+    def _request_stop(self, signum, frame):
+        self.stopping = True
+    
+    def _request_reload(self, signum, frame):
+        self.reload_requested = True
+    
+    def _spawn(self):
+        # Log-Writer beenden, damit er beim fork() keinen Lock auf stdout hält,
+        # den der Kindprozess dann nie wieder bekäme; gepufferte Ausgaben nicht
+        # in den Kindprozess kopieren
+        log.close()
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker()
+        self.children[pid] = time.time()
+        print(f"   👷 Worker {pid} gestartet")
+        return pid
+    
+    def _run_worker(self):
+        """Läuft im Kindprozess und kehrt nie zurück."""
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=self.server.shutdown).start())
+        exit_code = 0
+        try:
+            # Verbindungen des Elternprozesses nicht weiterverwenden
+            ollama_pools.clear()
+            config = load_config()
+            config['workers'] = self.workers
+            config['session_backend'] = 'sqlite'
+            apply_config(config)
+            start_services(config)
+            self.server.serve_forever()
+            self.server.executor.shutdown(wait=True)
+            sessions.close()
+        except Exception as e:
+            print(f"❌ Worker {os.getpid()} abgebrochen: {e}")
+            exit_code = 1
+        finally:
+            log.close()
+            sys.stdout.flush()
+            os._exit(exit_code)
+    
+    def _terminate(self, pid):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    
+    def _reap(self, respawn):
+        """Sammelt beendete Worker ein und startet sie bei Bedarf neu."""
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            started = self.children.pop(pid, None)
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                continue
+            if started is None or not respawn or self.stopping:
+                continue
+            print(f"   ⚠️  Worker {pid} beendet (Status {status}), starte neu...")
+            # Bei sofortigem Absturz nicht in einer Schleife neu starten
+            if time.time() - started < 1:
+                time.sleep(1)
+            self._spawn()
+    
+    def _reload(self):
+        """Ersetzt alle Worker nacheinander durch neue Prozesse."""
+        print("🔄 Graceful Reload: Worker werden ersetzt...")
+        for pid in list(self.children):
+            self._spawn()
+            self.retiring.add(pid)
+            self._terminate(pid)
+
+
+def read_batch_questions(path):
+    """Liest Fragen aus einer JSONL-Datei ({"question": ...} oder ein String pro Zeile)."""
+    questions = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                print(f"   ⚠️  Zeile {line_number} ist kein gültiges JSON, übersprungen")
+                continue
+            question = item if isinstance(item, str) else item.get('question') or item.get('message')
+            if isinstance(question, str) and question.strip():
+                questions.append(sanitize_text(question.strip()))
+    return questions
+
+
+def answer_question(question):
+    """Beantwortet eine Erstfrage wie /chat und liefert (Antwort, Ollama-Statistik)."""
+    settings, payload = build_ollama_request([ChatMessage('user', question)])
+    data = ollama_request(settings, 'POST', '/api/chat', payload)
+    response_text = data.get('message', {}).get('content', '')
+    if not response_text:
+        raise Exception('Leere Antwort von Ollama')
+    return response_text, data
+
+
+def run_batch(path, concurrency, force=False):
+    """Beantwortet alle Fragen einer JSONL-Datei und füllt den Antwort-Speicher.
+    
+    Fragen, die für die aktuelle Prompt-Version schon beantwortet sind,
+    werden übersprungen (außer mit force). Nach jeder Antwort wird die
+    Datei geschrieben, ein Abbruch verliert also nichts. Liefert die
+    Anzahl fehlgeschlagener Fragen.
+    """
+    questions = read_batch_questions(path)
+    snapshot = prompt_cache.refresh()
+    version = prompt_version(snapshot)
+    answers = {} if force else answer_store.entries(version)
+    
+    pending = {}
+    for question in questions:
+        key = normalize_question(question)
+        if key and key not in answers:
+            pending.setdefault(key, question)
+    
+    print(f"\n📚 Batch: {len(questions)} Fragen, {len(pending)} zu beantworten "
+          f"({concurrency} parallel, Version {version})")
+    lock = threading.Lock()
+    failed = 0
+    
+    def work(key, question):
+        nonlocal failed
+        started = time.monotonic()
+        try:
+            response_text, data = answer_question(question)
+        except Exception as e:
+            print(f"   ❌ {question[:60]}: {e}")
+            with lock:
+                failed += 1
+            return
+        duration = time.monotonic() - started
+        with lock:
+            answers[key] = {
+                'question': question,
+                'response': response_text,
+                'duration_ms': round(duration * 1000),
+                'prompt_tokens': data.get('prompt_eval_count'),
+                'eval_tokens': data.get('eval_count'),
+                'created_at': datetime.now().isoformat(),
+            }
+            answer_store.save(version, answers)
+        print(f"   ✅ {question[:60]} ({duration:.1f}s, {data.get('eval_count', '?')} Tokens)")
+    
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='batch') as executor:
+        for key, question in pending.items():
+            executor.submit(work, key, question)
+    
+    print(f"💾 {len(answers)} Antworten in {answer_store.path}")
+    return failed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='KernelFlow Chatbot Backend Server')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Anzahl Worker-Prozesse (Standard: CHATBOT_WORKERS bzw. config.json, sonst 1)')
+    parser.add_argument('--batch', metavar='FRAGEN.jsonl',
+                        help='Kein Server: Fragen aus der JSONL-Datei vorab beantworten und im Antwort-Speicher ablegen')
+    parser.add_argument('--batch-concurrency', type=int, default=None,
+                        help='Gleichzeitige Ollama-Aufrufe im Batch-Modus (Standard: Anzahl Ollama-Verbindungen)')
+    parser.add_argument('--batch-force', action='store_true',
+                        help='Auch bereits beantwortete Fragen neu generieren')
+    return parser.parse_args(argv)
+
+
+def main():
+    """Hauptfunktion - startet den Server."""
+    args = parse_args()
+    
+    print("=" * 60)
+    print("🤖 KernelFlow Chatbot Backend Server")
+    print("=" * 60)
+    
+    # Konfiguration laden
+    config = load_config()
+    if args.workers is not None:
+        config['workers'] = args.workers
+    if config['workers'] > 1 and not hasattr(os, 'fork'):
+        print("⚠️  Mehrere Worker-Prozesse werden nur unter Linux/macOS unterstützt, starte einen Prozess")
+        config['workers'] = 1
+    if config['workers'] > 1 and config['session_backend'] != 'sqlite':
+        # Sessions müssen zwischen den Prozessen geteilt werden
+        config['session_backend'] = 'sqlite'
+    apply_config(config)
+    settings = load_chatbot_settings()
+    
+    print(f"\n📋 Konfiguration:")
+    print(f"   Port: {CHATBOT_PORT}")
+    print(f"   Ollama URL: {', '.join(backend_urls(settings))}")
+    print(f"   Modell: {settings.get('ollamaModel', config['ollama_model'])}")
+    print(f"   Max Tokens: {settings.get('maxTokens', config['max_tokens'])}")
+    print(f"   Temperature: {settings.get('temperature', config['temperature'])}")
+    print(f"   Worker-Prozesse: {config['workers']}")
+    print(f"   Worker-Threads: {config['threads']} (+{config['backlog']} wartende Verbindungen)")
+    print(f"   Ollama-Verbindungen: {config['ollama_pool_size']}")
+    print(f"   Gleichzeitige Generierungen: {config['generation_concurrency'] or 'unbegrenzt'}")
+    print(f"   Session-Backend: {config['session_backend']}")
+    
+    # Teste Ollama-Verbindung (jedes Backend)
+    print(f"\n🔍 Teste Ollama-Verbindung...")
+    for ollama_url in backend_urls(settings):
+        try:
+            data = get_ollama_pool(ollama_url).request('GET', '/api/tags', timeout=5)
+            models = [m.get('name', 'unknown') for m in data.get('models', [])]
+            print(f"   ✅ Ollama erreichbar! ({ollama_url})")
+            print(f"   📦 Verfügbare Modelle: {', '.join(models) if models else 'Keine'}")
+            
+            model = settings.get('ollamaModel', config['ollama_model'])
+            if model not in models:
+                print(f"   ⚠️  Konfiguriertes Modell '{model}' nicht gefunden!")
+                print(f"   💡 Installiere mit: ollama pull {model}")
+        except Exception as e:
+            print(f"   ❌ Ollama nicht erreichbar ({ollama_url}): {e}")
+            print(f"   💡 Starte Ollama mit: ollama serve")
+    
+    # Prüfe Prompt-Dateien
+    print(f"\n📄 Prompt-Dateien:")
+    prompt_md = DATA_DIR / 'chatbot-system-prompt.md'
+    prompt_txt = DATA_DIR / 'chatbot-system-prompt.txt'
+    knowledge_file = DATA_DIR / 'chatbot-wissensbasis.md'
+    
+    if prompt_md.exists():
+        print(f"   ✅ System-Prompt: chatbot-system-prompt.md")
+    elif prompt_txt.exists():
+        print(f"   ✅ System-Prompt: chatbot-system-prompt.txt")
+    else:
+        print(f"   ⚠️  Kein System-Prompt gefunden (Standard wird verwendet)")
+    
+    if knowledge_file.exists():
+        print(f"   ✅ Wissensbasis: chatbot-wissensbasis.md")
+    else:
+        print(f"   ⚠️  Keine Wissensbasis gefunden")
+    
+    if args.batch:
+        concurrency = args.batch_concurrency or config['ollama_pool_size']
+        failed = run_batch(args.batch, concurrency, force=args.batch_force)
+        log.close()
+        sys.exit(1 if failed else 0)
+    
+    # Server starten
+    print(f"\n🚀 Starte Server auf Port {CHATBOT_PORT}...")
+    server = PooledHTTPServer(('0.0.0.0', CHATBOT_PORT), ChatbotHandler,
+                              max_workers=config['threads'], backlog=config['backlog'])
+    
+    print(f"\n✅ Server läuft!")
+    print(f"   📍 Local: http://localhost:{CHATBOT_PORT}")
+    print(f"   📍 Health: http://localhost:{CHATBOT_PORT}/health")
     print(f"   📍 Test Ollama: http://localhost:{CHATBOT_PORT}/test-ollama")
+    print(f"   📍 Metriken: http://localhost:{CHATBOT_PORT}/metrics")
     print(f"\n💡 Drücke Ctrl+C zum Beenden\n")
     
+    if config['workers'] > 1:
+        # Snapshot vor dem Fork bauen, damit alle Worker ihn sofort haben;
+        # die Hintergrund-Threads startet jeder Worker selbst
+        prompt_cache.refresh()
+        PreforkSupervisor(server, config['workers']).run()
+        log.close()
+        print("👋 Auf Wiedersehen!")
+        return
+    
+    start_services(config)
     try:
         server.serve_forever()
     except KeyboardInterrupt:
         print("\n\n🛑 Server wird beendet...")
         server.shutdown()
+        sessions.close()
+        log.close()
         print("👋 Auf Wiedersehen!")
 
 
@@ -381,6 +381,22 @@ function getClientIP(req) {
          '127.0.0.1';
 }
 
+// Visitor address forwarded to the Python server's rate limit. Behind the
+// Cloudflare Tunnel every request arrives from loopback, so the tunnel's
+// headers are trusted only then; direct peers cannot pick their own bucket.
+function getForwardedIP(req) {
+  const peer = req.socket.remoteAddress || '';
+  const isLoopback = peer === '::1' || peer.startsWith('127.') || peer.startsWith('::ffff:127.');
+  if (isLoopback) {
+    const cfIP = req.headers['cf-connecting-ip']?.trim();
+    if (cfIP) return cfIP;
+    // The last hop is the one appended by the tunnel, earlier ones are client-supplied
+    const hops = (req.headers['x-forwarded-for'] || '').split(',').map(hop => hop.trim()).filter(Boolean);
+    if (hops.length > 0) return hops[hops.length - 1];
+  }
+  return peer;
+}
+
 // Sanitize text input
 function sanitizeText(text) {
   if (!text) return '';
@@ -1098,11 +1114,21 @@ async function handleAPI(req, res, urlPath) {
       // Get session ID from header or body
       const sessionId = req.headers['x-session-id'] || body.session_id;
       
+      // Abort the upstream request when the browser goes away, so the Python
+      // server notices the closed connection and cancels the generation
+      const upstream = new AbortController();
+      res.on('close', () => {
+        if (!res.writableEnded) upstream.abort();
+      });
+      
       // Forward request to Python server
+      const forwardedIP = getForwardedIP(req);
       const proxyResponse = await fetch(`${pythonServerUrl}/chat`, {
         method: 'POST',
+        signal: upstream.signal,
         headers: {
           'Content-Type': 'application/json',
+          ...(forwardedIP && { 'X-Forwarded-For': forwardedIP }),
           ...(sessionId && { 'X-Session-ID': sessionId })
         },
         body: JSON.stringify(body)
@@ -1112,13 +1138,18 @@ async function handleAPI(req, res, urlPath) {
       
       if (!proxyResponse.ok) {
         console.error(`[${timestamp}] ❌ Python server error:`, data);
-        sendJSON(res, proxyResponse.status, data);
+        const retryAfter = proxyResponse.headers.get('retry-after');
+        sendJSON(res, proxyResponse.status, data, retryAfter ? { 'Retry-After': retryAfter } : {});
         return true;
       }
       
       console.log(`[${timestamp}] ✅ Python chatbot response received`);
       sendJSON(res, 200, data);
     } catch (error) {
+      if (error.name === 'AbortError') {
+        console.log(`[${timestamp}] ⏹️ Client disconnected, Python request aborted`);
+        return true;
+      }
       console.error(`[${timestamp}] ❌ Python proxy error:`, error.message);
       sendJSON(res, 503, { 
         error: 'Python Chatbot-Server nicht erreichbar.',